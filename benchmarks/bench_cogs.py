@@ -0,0 +1,201 @@
+# bench_cogs.py
+""" Drive the real QueueCog and CacherCog with a mix of commands and reactions from synthetic guilds.
+
+Runs against the fake gateway and REST layer in fakediscord.py and reports throughput, per-event latency
+percentiles, outbound REST calls and memory so regressions in the hot paths show up before deploying.
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import discord
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qbot'))
+
+import cogs  # noqa: E402
+from cogs.queue import distress, watering_can  # noqa: E402
+from cogs.utils.storage import JsonStorage  # noqa: E402
+from fakediscord import FakeGateway, FakeREST  # noqa: E402
+from qbot import BOT_COLOR, QBot  # noqa: E402
+
+# Relative weights of each event in the generated traffic
+MIX = {'join': 35, 'leave': 20, 'view': 10, 'dodo': 10, 'water': 15, 'unwater': 5, 'remove': 5, 'distress': 1}
+
+
+class BenchBot(QBot):
+    """ Bot whose commands are invoked by the benchmark itself so each one can be timed. """
+
+    async def on_message(self, message):
+        pass
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Bench:
+    """ Synthetic guilds and the traffic generated against them. """
+
+    def __init__(self, bot, gateway, guilds):
+        """ Set attributes. """
+        self.bot = bot
+        self.gateway = gateway
+        self.guilds = guilds
+        self.queue_cog = bot.get_cog('QueueCog')
+        self.latencies = defaultdict(list)  # Maps event name -> seconds each one took
+
+    async def command(self, member, content, mentions=()):
+        """ Deliver a message to the listeners and invoke the command in it like the bot's on_message would. """
+        message = self.gateway.message(member, content, mentions)
+        self.bot.dispatch('message', message)
+        ctx = await self.bot.get_context(message)
+        await self.bot.invoke(ctx)
+
+    async def react(self, member, emoji, event_type, post=None):
+        """ Deliver a reaction to a live Dodo post, one of the guild's if not given, to the raw reaction listeners. """
+        queue = self.queue_cog.guild_queues.get(member.guild.id)
+
+        if post is None and (not queue or not queue.curr_posts):  # Nothing to react to yet
+            return await self.command(member, 'q!view')
+
+        post = post or random.choice(queue.curr_posts)
+        payload = self.gateway.reaction(post.message_id, member, emoji, event_type)
+        event = 'raw_reaction_add' if event_type == 'REACTION_ADD' else 'raw_reaction_remove'
+        await asyncio.gather(*(listener(payload) for listener in self.bot.extra_events[f'on_{event}']))
+
+    async def event(self, name):
+        """ Generate and time a single event in a random guild. """
+        guild = random.choice(self.guilds)
+        members = [member for member in guild.members if not member.bot]
+        member = random.choice(members)
+        queue = self.queue_cog.guild_queues.get(guild.id)
+        start = time.perf_counter()
+
+        if name == 'dodo':
+            head = guild.get_member(queue.active.head) if queue and queue.active else None
+            await self.command(head or member, f'q!dodo {random.choice(("ABCDE", "FGHJK", "Q1W2E"))}')
+        elif name == 'water':
+            await self.react(member, watering_can.emoji, 'REACTION_ADD')
+        elif name == 'unwater':
+            await self.react(member, watering_can.emoji, 'REACTION_REMOVE')
+        elif name == 'distress':  # The host of the latest post asks to be requeued
+            post = queue.curr_posts[-1] if queue and queue.curr_posts else None
+            host = post and guild.get_member(post.host_id)
+            await self.react(host or member, distress.emoji, 'REACTION_ADD', post if host else None)
+        elif name == 'remove':
+            target = random.choice(members)
+            await self.command(members[0], f'q!remove <@{target.id}>', mentions=(target.id,))
+        else:
+            await self.command(member, f'q!{name}')
+
+        self.latencies[name].append(time.perf_counter() - start)
+
+    async def run(self, events, concurrency):
+        """ Generate events keeping up to concurrency of them in flight and return the seconds it took. """
+        names = random.choices(list(MIX), weights=list(MIX.values()), k=events)
+        start = time.perf_counter()
+
+        for i in range(0, events, concurrency):
+            await asyncio.gather(*(self.event(name) for name in names[i:i + concurrency]))
+
+        return time.perf_counter() - start
+
+    async def drain(self):
+        """ Wait for debounced renders, outbound calls and queued DMs to go out. """
+        renderer = self.queue_cog.renderer
+        outbound = self.bot.outbound
+
+        while renderer.tasks or outbound.workers:
+            await asyncio.gather(*list(renderer.tasks.values()), *list(outbound.workers.values()))
+
+        if self.queue_cog.dms.queue:
+            await self.queue_cog.dms.queue.join()
+
+
+def memory(label):
+    if not tracemalloc.is_tracing():
+        return
+
+    current, peak = tracemalloc.get_traced_memory()
+    print(f'{label:<24}{current / 2 ** 20:>10.1f} MiB current {peak / 2 ** 20:>10.1f} MiB peak')
+
+
+async def main(args):
+    if args.memory:  # Tracing allocations roughly halves throughput
+        tracemalloc.start()
+
+    random.seed(args.seed)
+    directory = tempfile.TemporaryDirectory()
+    storage = JsonStorage(os.path.join(directory.name, 'guild_data.json'), journal=True)
+    bot = BenchBot(command_prefix=('q!', 'Q!'), case_insensitive=True, intents=discord.Intents.all())
+
+    if args.record:  # Keep the generated traffic for benchmarks/replay.py, added first like create_bot does
+        bot.add_cog(cogs.RecorderCog(bot, args.record))
+
+    bot.add_cog(cogs.CacherCog(bot, storage))
+    bot.add_cog(cogs.HelpCog(bot, BOT_COLOR))
+    bot.add_cog(cogs.LeaderboardCog(bot, BOT_COLOR))
+    bot.add_cog(cogs.QueueCog(bot, BOT_COLOR))
+    bot.get_cog('QueueCog').renderer.delay = args.render_delay
+    gateway = FakeGateway(bot)
+    rest = FakeREST(bot, gateway, latency=args.latency)
+    guilds = [gateway.add_guild(args.members) for _ in range(args.guilds)]
+    await bot.startup.run()
+    memory('after setup')
+
+    bench = Bench(bot, gateway, guilds)
+    elapsed = await bench.run(args.events, args.concurrency)
+    memory('after run')
+    await bench.drain()
+    await bot.get_cog('CacherCog').save()
+    memory('after drain and save')
+
+    print(f'\n{args.events} events in {elapsed:.2f} s ({args.events / elapsed:.0f} events/s) across '
+          f'{args.guilds} guilds of {args.members} members\n')
+    print(f'{"event":<10}{"count":>8}{"p50 (ms)":>10}{"p99 (ms)":>10}{"max (ms)":>10}')
+
+    for name, samples in sorted(bench.latencies.items()):
+        print(f'{name:<10}{len(samples):>8}{percentile(samples, 0.5) * 1000:>10.2f}'
+              f'{percentile(samples, 0.99) * 1000:>10.2f}{max(samples) * 1000:>10.2f}')
+
+    print(f'\n{"REST call":<72}{"count":>8}{"per event":>10}')
+
+    for (method, path), count in rest.calls.most_common():
+        print(f'{method + " " + path:<72}{count:>8}{count / args.events:>10.2f}')
+
+    print(f'{"total":<72}{rest.total:>8}{rest.total / args.events:>10.2f}')
+    print('\noutbound ' + ', '.join(f'{outcome} {count}' for outcome, count in bot.outbound.stats.items()))
+    print('startup ' + ', '.join(f'{step} {duration * 1000:.1f} ms after {began * 1000:.1f} ms'
+                                 for step, (began, duration) in bot.startup.timings.items()))
+    bot.get_cog('CacherCog').periodic_save.cancel()
+    bot.get_cog('QueueCog').cog_unload()
+    bot.get_cog('LeaderboardCog').cog_unload()
+
+    if args.record:
+        print(f'\nRecorded traffic to {bot.get_cog("RecorderCog").path}')
+        bot.get_cog('RecorderCog').cog_unload()
+
+    await storage.close()
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=1000)
+    parser.add_argument('--members', type=int, default=50, help='members per guild')
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=100, help='events in flight at once')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each fake REST call takes')
+    parser.add_argument('--render-delay', type=float, default=0.05, help='debounce delay of queue embed renders')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="don't trace memory usage")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--record', help='record the generated traffic to this path for replay.py')
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+# bench_indexed_queue.py
+""" Compare IndexedQueue against the plain list QQueue.active used to be at different queue sizes. """
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qbot'))
+
+from cogs.utils.indexedqueue import IndexedQueue  # noqa: E402
+
+SIZES = (10, 100, 1000)
+
+
+class User:
+    """ Minimal stand-in for a discord.Member (only the ID is used). """
+
+    __slots__ = ('id',)
+
+    def __init__(self, id):
+        self.id = id
+
+    def __eq__(self, other):
+        return self.id == other.id
+
+    def __hash__(self):
+        return self.id
+
+
+def list_ops(users):
+    """ Build the old list-based operations for the given users. """
+    active = list(users)
+    last = users[-1]
+    middle = users[len(users) // 2]
+
+    def contains():
+        return last in active
+
+    def position():
+        for i in range(len(active)):  # Hand-rolled scan like promote/demote did
+            if active[i] == last:
+                return i
+
+    def leave_join():
+        active.remove(middle)
+        active.append(middle)
+
+    def promote():
+        for offset in (-1, 1):  # Each command checked membership then scanned for the user like promote/demote did
+            if last in active:
+                for i in range(len(active)):
+                    if active[i] == last:
+                        break
+
+                active[i], active[i + offset] = active[i + offset], active[i]
+
+    return {'contains': contains, 'position': position, 'leave+join': leave_join, 'promote+demote': promote}
+
+
+def indexed_ops(users):
+    """ Build the same operations against an IndexedQueue. """
+    active = IndexedQueue(users)
+    last = users[-1]
+    middle = users[len(users) // 2]
+
+    def contains():
+        return last in active
+
+    def position():
+        return active.index(last)
+
+    def leave_join():
+        active.remove(middle)
+        active.append(middle)
+
+    def promote():
+        for offset in (-1, 1):
+            if last in active:
+                active.move(last, active.index(last) + offset)
+
+    return {'contains': contains, 'position': position, 'leave+join': leave_join, 'promote+demote': promote}
+
+
+def main(number=20000):
+    """ Time every operation for each queue size and print a table in nanoseconds per call. """
+    print(f'{"op":<16}{"size":>6}{"list (ns)":>12}{"indexed (ns)":>14}{"speedup":>9}')
+
+    for size in SIZES:
+        users = [User(i) for i in range(size)]
+        old = list_ops(users)
+        new = indexed_ops(users)
+
+        for op in old:
+            old_ns = min(timeit.repeat(old[op], number=number, repeat=3)) / number * 1e9
+            new_ns = min(timeit.repeat(new[op], number=number, repeat=3)) / number * 1e9
+            print(f'{op:<16}{size:>6}{old_ns:>12.0f}{new_ns:>14.0f}{old_ns / new_ns:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# bench_memory.py
+""" Measure the memory QueueCog state takes per guild once its queue, points and Dodo posts are in use.
+
+Guilds and members are created through the fake gateway before tracing starts so only what the cog allocates and
+keeps alive is counted. discord.py's own message cache is disabled for the same reason.
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+
+import discord
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qbot'))
+
+import cogs  # noqa: E402
+from cogs.queue import watering_can  # noqa: E402
+from bench_cogs import BenchBot  # noqa: E402
+from fakediscord import FakeGateway, FakeREST  # noqa: E402
+from qbot import BOT_COLOR  # noqa: E402
+
+
+async def fill_guild(bot, gateway, guild, queued, posts):
+    """ Queue members, have the head post Dodo codes and water them with reactions. """
+    queue_cog = bot.get_cog('QueueCog')
+    members = [member for member in guild.members if not member.bot]
+
+    for member in members[:queued]:
+        ctx = await bot.get_context(gateway.message(member, 'q!join'))
+        await bot.invoke(ctx)
+
+    for _ in range(posts):
+        ctx = await bot.get_context(gateway.message(members[0], 'q!dodo ABCDE'))
+        await bot.invoke(ctx)
+        post = queue_cog.guild_queues[guild.id].curr_posts[-1]
+
+        for member in members[1:queued]:
+            await queue_cog.on_raw_reaction_add(gateway.reaction(post.message_id, member, watering_can.emoji))
+
+
+async def main(args):
+    bot = BenchBot(command_prefix=('q!', 'Q!'), case_insensitive=True, intents=discord.Intents.all(),
+                   max_messages=None)
+    bot.add_cog(cogs.QueueCog(bot, BOT_COLOR))
+    queue_cog = bot.get_cog('QueueCog')
+    queue_cog.renderer.delay = 0
+    gateway = FakeGateway(bot)
+    FakeREST(bot, gateway)
+    guilds = [gateway.add_guild(args.members) for _ in range(args.guilds)]
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    for guild in guilds:
+        await fill_guild(bot, gateway, guild, args.queued, args.posts)
+
+    while queue_cog.renderer.tasks or bot.outbound.workers:
+        await asyncio.gather(*list(queue_cog.renderer.tasks.values()), *list(bot.outbound.workers.values()))
+
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    print(f'{args.guilds} guilds with {args.queued} queued members and {args.posts} watered Dodo posts each')
+    print(f'{(current - baseline) / args.guilds / 1024:.1f} KiB per guild')
+    queue_cog.cog_unload()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=200)
+    parser.add_argument('--members', type=int, default=20, help='members per guild')
+    parser.add_argument('--queued', type=int, default=10, help='members in each queue')
+    parser.add_argument('--posts', type=int, default=5, help='Dodo posts per guild')
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
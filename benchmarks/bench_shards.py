@@ -0,0 +1,112 @@
+# bench_shards.py
+""" Run the sharded mode locally with supervised shard processes driven by the fake gateway.
+
+Each process runs a range of shards with per-shard storage in a temporary directory and generates traffic for the
+guilds on its shards. With --crash the first process exits abruptly halfway through its first run so the supervisor
+restarts it and the restarted process restores the queues it had journaled.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import discord
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qbot'))
+
+from bench_cogs import Bench  # noqa: E402
+from cogs.utils.storage import JsonStorage, ShardedStorage  # noqa: E402
+from fakediscord import FakeGateway, FakeREST  # noqa: E402
+from qbot import ShardedQBot, create_bot, shard_path  # noqa: E402
+from supervisor import Supervisor  # noqa: E402
+
+
+class ShardBenchBot(ShardedQBot):
+    """ Sharded bot whose commands are invoked by the benchmark itself. """
+
+    async def on_message(self, message):
+        pass
+
+
+async def fake_shards(shard_ids, shard_count, directory, guilds, members, events, crash):
+    """ Run a range of shards against the fake gateway and report what was restored and how fast events ran. """
+    name = f'shards {shard_ids[0]}-{shard_ids[-1]}'
+    random.seed(f'{name} {time.time()}')
+    path = os.path.join(directory, 'guild_data.json')
+    storage = ShardedStorage(shard_ids, shard_count,
+                             lambda shard_id: JsonStorage(shard_path(path, f'shard{shard_id}'), journal=True))
+    bot = create_bot(ShardBenchBot, storage, generic=True, shard_ids=shard_ids, shard_count=shard_count,
+                     intents=discord.Intents.all())
+    queue_cog = bot.get_cog('QueueCog')
+    cacher_cog = bot.get_cog('CacherCog')
+    queue_cog.renderer.delay = 0.05
+    gateway = FakeGateway(bot)
+    FakeREST(bot, gateway)
+    guild_ids = [((i + 1) * shard_count + shard_id) << 22 for shard_id in shard_ids for i in range(guilds)]
+    fake_guilds = [gateway.add_guild(members, guild_id) for guild_id in guild_ids]
+    await bot.startup.run()
+    restored = 0
+
+    for guild in fake_guilds:
+        restored += len((await queue_cog.get_queue(guild)).active)
+
+    bench = Bench(bot, gateway, fake_guilds)
+    marker = os.path.join(directory, f'crashed {name}')
+
+    if crash and not os.path.exists(marker):
+        await bench.run(events // 2, 100)
+        await bench.drain()
+        await asyncio.sleep(0.1)  # Let the queue mutation listeners journal the last changes
+        open(marker, 'w').close()
+        print(f'{name}: crashing after {events // 2} events', flush=True)
+        os._exit(1)
+
+    elapsed = await bench.run(events, 100)
+    await bench.drain()
+    await cacher_cog.save()
+    print(f'{name}: restored {restored} queued members, {events} events in {elapsed:.2f} s '
+          f'({events / elapsed:.0f} events/s)', flush=True)
+    cacher_cog.periodic_save.cancel()
+    queue_cog.cog_unload()
+    bot.get_cog('LeaderboardCog').cog_unload()
+    await storage.close()
+
+
+def run_fake_shards(*args):
+    """ Process entry point running fake_shards on a new event loop. """
+    asyncio.get_event_loop().run_until_complete(fake_shards(*args))
+
+
+def main(args):
+    directory = tempfile.TemporaryDirectory()
+    workers = {}
+
+    for i in range(args.processes):
+        shard_ids = list(range(i * args.shards // args.processes, (i + 1) * args.shards // args.processes))
+        crash = args.crash and i == 0
+        workers[f'shards {shard_ids[0]}-{shard_ids[-1]}'] = (
+            (shard_ids, args.shards, directory.name, args.guilds, args.members, args.events, crash), {})
+
+    start = time.perf_counter()
+    Supervisor(run_fake_shards, workers, poll_interval=0.1).run()
+    print(f'\nAll shards finished in {time.perf_counter() - start:.2f} s\n')
+
+    for file_name in sorted(os.listdir(directory.name)):
+        print(f'{file_name:<40}{os.path.getsize(os.path.join(directory.name, file_name)):>10} bytes')
+
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--guilds', type=int, default=100, help='guilds per shard')
+    parser.add_argument('--members', type=int, default=20, help='members per guild')
+    parser.add_argument('--events', type=int, default=5000, help='events per process')
+    parser.add_argument('--crash', action='store_true', help='crash the first process once to test restarts')
+    main(parser.parse_args())
@@ -0,0 +1,94 @@
+# bench_timerwheel.py
+""" Compare TimerWheel against a heap of timers (what loop.call_at uses) with many pending timers. """
+
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qbot'))
+
+from cogs.utils.timerwheel import TimerWheel  # noqa: E402
+
+COUNTS = (10000, 100000, 500000)
+HORIZON = 24 * 60 * 60  # Timers are spread over a day like point checks and timeouts
+
+
+class HeapTimers:
+    """ Heap of timers with lazy cancellation, like the asyncio event loop's scheduled callbacks. """
+
+    def __init__(self):
+        self.heap = []
+        self.seq = 0
+
+    def schedule(self, deadline, callback):
+        entry = [deadline, self.seq, callback]
+        self.seq += 1
+        heapq.heappush(self.heap, entry)
+        return entry
+
+    @staticmethod
+    def cancel(entry):
+        entry[2] = None
+
+    def advance(self, now):
+        while self.heap and self.heap[0][0] <= now:
+            _, _, callback = heapq.heappop(self.heap)
+
+            if callback:
+                callback()
+
+
+def run(count, make):
+    """ Time scheduling, cancelling half and then running through the whole horizon. """
+    clock = [0.0]
+    timers, schedule, cancel = make(clock)
+    deadlines = [random.uniform(0, HORIZON) for _ in range(count)]
+    fired = [0]
+
+    def callback():
+        fired[0] += 1
+
+    start = time.perf_counter()
+    handles = [schedule(deadline, callback) for deadline in deadlines]
+    insert = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for handle in handles[::2]:
+        cancel(handle)
+    cancelling = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for second in range(0, HORIZON + 2, 60):  # Advance a minute at a time
+        clock[0] = second
+        timers.advance(second)
+    advance = time.perf_counter() - start
+
+    assert fired[0] == count // 2
+    return insert / count * 1e9, cancelling / (count // 2) * 1e9, advance
+
+
+def make_wheel(clock):
+    wheel = TimerWheel(clock=lambda: clock[0])
+    wheel.start = lambda: None  # Driven manually
+    return wheel, wheel.schedule, lambda timer: timer.cancel()
+
+
+def make_heap(clock):
+    heap = HeapTimers()
+    return heap, heap.schedule, HeapTimers.cancel
+
+
+def main():
+    """ Print insert and cancel cost per timer and total time to run a day's worth of timers. """
+    print(f'{"impl":<8}{"timers":>8}{"insert (ns)":>13}{"cancel (ns)":>13}{"advance (s)":>13}')
+
+    for count in COUNTS:
+        for name, make in (('heap', make_heap), ('wheel', make_wheel)):
+            insert, cancel, advance = run(count, make)
+            print(f'{name:<8}{count:>8}{insert:>13.0f}{cancel:>13.0f}{advance:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
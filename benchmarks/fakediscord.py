@@ -0,0 +1,173 @@
+# fakediscord.py
+""" In-process stand-ins for the Discord gateway and REST API so the real cogs can be driven without a connection.
+
+FakeGateway builds guilds, channels, members and messages through discord.py's own models and connection state, the
+same way gateway payloads are turned into objects, and FakeREST replaces the bot's HTTP client request method with
+one that counts every outbound call and answers it with a well-formed payload.
+"""
+
+import asyncio
+from collections import Counter
+import datetime
+import itertools
+
+import discord
+
+EPOCH = '2020-05-01T00:00:00+00:00'
+
+
+class FakeREST:
+    """ Answers the bot's REST calls locally, counting them by method and route. """
+
+    def __init__(self, bot, gateway, latency=0.0):
+        """ Set attributes and take over the bot's HTTP requests. """
+        self.gateway = gateway
+        self.latency = latency  # Seconds every call takes, to model the round trip to Discord
+        self.calls = Counter()  # Maps (method, route path) -> calls made
+        bot.http.request = self.request
+
+    async def request(self, route, **kwargs):
+        self.calls[route.method, route.path] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        payload = kwargs.get('json') or {}
+
+        if route.method == 'POST' and route.path == '/channels/{channel_id}/messages':
+            return self.gateway.message_data(route.channel_id, self.gateway.bot_user, payload.get('content'),
+                                             embed=payload.get('embed'))
+        if route.method == 'PATCH' and route.path == '/channels/{channel_id}/messages/{message_id}':
+            message_id = int(route.url.rsplit('/', 1)[1])
+            return self.gateway.message_data(route.channel_id, self.gateway.bot_user, payload.get('content'),
+                                             embed=payload.get('embed'), message_id=message_id)
+        if route.method == 'POST' and route.path == '/users/@me/channels':
+            recipient = self.gateway.users[int(payload['recipient_id'])]
+            return {'id': self.gateway.next_id(), 'type': 1, 'recipients': [recipient]}
+
+        return None  # Typing, deletes and reactions have no body
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class FakeGateway:
+    """ Creates synthetic guilds and members in a bot's connection state and the events a gateway would send. """
+
+    def __init__(self, bot):
+        """ Set attributes, log the bot in as a synthetic user and take its presence updates. """
+        self.bot = bot
+        self.state = bot._connection
+        self.ids = itertools.count(10 ** 17)
+        self.users = {}  # Maps user ID -> user payload
+        self.bot_user = self.user_data('qbot', bot=True)
+        self.state.user = discord.ClientUser(state=self.state, data=self.bot_user)
+        self.presences = []  # Activities the bot set
+        bot.change_presence = self.change_presence
+
+    async def change_presence(self, activity=None, **kwargs):
+        self.presences.append(activity)
+
+    def next_id(self):
+        return next(self.ids)
+
+    def user_data(self, name, bot=False, user_id=None):
+        """ Create the payload of a new user. """
+        user_id = user_id or self.next_id()
+        data = {'id': str(user_id), 'username': name, 'discriminator': f'{user_id % 10000:04d}', 'avatar': None,
+                'bot': bot}
+        self.users[user_id] = data
+        return data
+
+    def add_guild(self, members, guild_id=None):
+        """ Create a guild with a single text channel and the given number of members, the first being its owner. """
+        guild_id = guild_id or self.next_id()
+        users = [self.user_data(f'islander{i}') for i in range(members)]
+        data = {
+            'id': str(guild_id),
+            'name': f'guild {guild_id}',
+            'owner_id': users[0]['id'],
+            'region': 'us-west',
+            'member_count': members + 1,
+            'roles': [{'id': str(guild_id), 'name': '@everyone',
+                       'permissions': str(discord.Permissions.general().value), 'position': 0,
+                       'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+            'channels': [{'id': str(self.next_id()), 'type': 0, 'name': 'queue', 'position': 0,
+                          'permission_overwrites': []}],
+            'members': [{'user': user, 'roles': [], 'joined_at': EPOCH, 'deaf': False, 'mute': False}
+                        for user in users + [self.bot_user]]
+        }
+        guild = discord.Guild(data=data, state=self.state)
+        self.state._add_guild(guild)
+        return guild
+
+    def guild(self, guild_id):
+        """ Get a guild by ID, creating it with a single member if it doesn't exist. """
+        return self.bot.get_guild(guild_id) or self.add_guild(1, guild_id)
+
+    def member(self, guild, user_id):
+        """ Get a member of a guild by user ID, creating the user and member if they don't exist. """
+        member = guild.get_member(user_id)
+
+        if member is None:
+            user = self.users.get(user_id) or self.user_data(f'user{user_id}', user_id=user_id)
+            data = {'user': user, 'roles': [], 'joined_at': EPOCH, 'deaf': False, 'mute': False}
+            member = discord.Member(data=data, guild=guild, state=self.state)
+            guild._add_member(member)
+            guild._member_count += 1
+
+        return member
+
+    def channel(self, guild, channel_id):
+        """ Get a text channel of a guild by ID, creating it if it doesn't exist. """
+        channel = guild.get_channel(channel_id)
+
+        if channel is None:
+            data = {'id': str(channel_id), 'type': 0, 'name': f'channel{len(guild.channels)}',
+                    'position': len(guild.channels), 'permission_overwrites': []}
+            channel = discord.TextChannel(state=self.state, guild=guild, data=data)
+            guild._add_channel(channel)
+
+        return channel
+
+    def message_data(self, channel_id, author, content, embed=None, mentions=(), message_id=None):
+        """ Create the payload of a message in a channel. """
+        return {
+            'id': str(message_id or self.next_id()),
+            'channel_id': str(channel_id),
+            'type': 0,
+            'content': content or '',
+            'author': author,
+            'member': {'roles': [], 'joined_at': EPOCH, 'deaf': False, 'mute': False},
+            'embeds': [embed] if embed else [],
+            'attachments': [],
+            'mentions': [self.users[user_id] for user_id in mentions],
+            'mention_roles': [],
+            'mention_everyone': False,
+            'pinned': False,
+            'tts': False,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'edited_timestamp': None
+        }
+
+    def message(self, member, content, mentions=(), channel=None):
+        """ Create a message sent by a member in a channel, their guild's first text channel by default. """
+        channel = channel or member.guild.text_channels[0]
+        data = self.message_data(channel.id, self.users[member.id], content, mentions=mentions)
+        return discord.Message(state=self.state, channel=channel, data=data)
+
+    def reaction(self, message_id, member, emoji, event_type='REACTION_ADD', channel=None):
+        """ Create the payload of a raw reaction event by a member. """
+        channel = channel or member.guild.text_channels[0]
+        data = {'message_id': message_id, 'channel_id': channel.id, 'user_id': member.id, 'guild_id': member.guild.id}
+
+        if emoji.startswith('<'):  # Custom emoji in the <:name:id> form
+            name, emoji_id = emoji.strip('<>').split(':')[1:]
+            partial = discord.PartialEmoji(name=name, id=int(emoji_id))
+        else:
+            partial = discord.PartialEmoji(name=emoji)
+
+        payload = discord.RawReactionActionEvent(data, partial, event_type)
+        payload.member = member if event_type == 'REACTION_ADD' else None
+        return payload
@@ -0,0 +1,194 @@
+# replay.py
+""" Replay traffic recorded by RecorderCog through the real cogs against the fake gateway and REST layer.
+
+Events are fed back at their recorded times scaled by --speed, or one after another as fast as possible with
+--speed 0, which also makes the run deterministic. Per-event latency percentiles and outbound REST calls are reported
+and can be written as JSON with --summary, so two versions of the bot can be compared on identical traffic.
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+import json
+import os
+import sys
+import tempfile
+import time
+
+import discord
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'qbot'))
+
+import cogs  # noqa: E402
+from cogs.queue import distress  # noqa: E402
+from cogs.utils.storage import JsonStorage  # noqa: E402
+from cogs.utils.traffic import read_traffic  # noqa: E402
+from bench_cogs import BenchBot, percentile  # noqa: E402
+from fakediscord import FakeGateway, FakeREST  # noqa: E402
+from qbot import BOT_COLOR  # noqa: E402
+
+
+class Replay:
+    """ Turns recorded events back into gateway events for the cogs and times how long each takes. """
+
+    def __init__(self, bot, gateway):
+        """ Set attributes. """
+        self.bot = bot
+        self.gateway = gateway
+        self.queue_cog = bot.get_cog('QueueCog')
+        self.posts = {}  # Maps recorded Dodo post ID -> ID of the post made for it in the replay
+        self.latencies = defaultdict(list)  # Maps event name -> seconds each one took
+        self.unmatched = 0  # Reactions to Dodo posts that weren't made in the replay
+
+    def post_id(self, event, channel):
+        """ Get the replayed post a recorded reaction is for, the latest live post of the same host in the channel. """
+        if event['p'] not in self.posts:
+            queue = self.queue_cog.guild_queues.get(channel.guild.id)
+
+            for announcement in reversed(queue.curr_posts if queue else ()):
+                if announcement.host_id == event['h'] and announcement.channel_id == channel.id:
+                    self.posts[event['p']] = announcement.message_id
+                    break
+
+        return self.posts.get(event['p'])
+
+    async def message(self, event, guild):
+        """ Deliver a message to the listeners and invoke the command in it like the bot's on_message would. """
+        channel = self.gateway.channel(guild, event['c'])
+        member = self.gateway.member(guild, event['u'])
+        mentions = event.get('m', ())
+
+        for user_id in mentions:
+            self.gateway.member(guild, user_id)
+
+        message = self.gateway.message(member, event.get('x', ''), mentions, channel)
+        self.bot.dispatch('message', message)
+
+        if 'x' not in event:  # Only moves queue posts up the channel
+            return 'chatter'
+
+        ctx = await self.bot.get_context(message)
+        await self.bot.invoke(ctx)
+        return ctx.command.qualified_name if ctx.command else 'other'
+
+    async def reaction(self, event, guild):
+        """ Deliver a reaction to the raw reaction listeners. """
+        channel = self.gateway.channel(guild, event['c'])
+        message_id = self.post_id(event, channel)
+
+        if message_id is None:
+            self.unmatched += 1
+            return None
+
+        event_type = 'REACTION_ADD' if event['e'] == 'add' else 'REACTION_REMOVE'
+        payload = self.gateway.reaction(message_id, self.gateway.member(guild, event['u']), event['x'], event_type,
+                                        channel)
+        name = 'raw_reaction_add' if event['e'] == 'add' else 'raw_reaction_remove'
+        await asyncio.gather(*(listener(payload) for listener in self.bot.extra_events[f'on_{name}']))
+        return 'distress' if event['x'] == distress.emoji else f'reaction {event["e"]}'
+
+    async def event(self, event):
+        """ Replay and time a single event. """
+        guild = self.gateway.guild(event['g'])
+        start = time.perf_counter()
+
+        if event['e'] == 'msg':
+            name = await self.message(event, guild)
+        elif event['e'] in ('add', 'rm'):
+            name = await self.reaction(event, guild)
+        else:
+            name = f'guild {event["e"]}'
+            self.bot.dispatch('guild_join' if event['e'] == 'join' else 'guild_remove', guild)
+
+        if name:
+            self.latencies[name].append(time.perf_counter() - start)
+
+    async def play(self, events, speed):
+        """ Replay events at their recorded times divided by speed, or in order without waiting if speed is 0. """
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        tasks = []
+
+        for event in events:
+            if not speed:
+                await self.event(event)
+                continue
+
+            delay = start + event['t'] / speed - loop.time()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            tasks.append(loop.create_task(self.event(event)))
+
+        await asyncio.gather(*tasks)
+        return loop.time() - start
+
+    async def drain(self):
+        """ Wait for debounced renders, outbound calls and queued DMs to go out. """
+        renderer = self.queue_cog.renderer
+        outbound = self.bot.outbound
+
+        while renderer.tasks or outbound.workers:
+            await asyncio.gather(*list(renderer.tasks.values()), *list(outbound.workers.values()))
+
+        if self.queue_cog.dms.queue:
+            await self.queue_cog.dms.queue.join()
+
+
+async def main(args):
+    _, events = read_traffic(args.recording)
+    directory = tempfile.TemporaryDirectory()
+    storage = JsonStorage(os.path.join(directory.name, 'guild_data.json'), journal=True)
+    bot = BenchBot(command_prefix=('q!', 'Q!'), case_insensitive=True, intents=discord.Intents.all())
+    bot.add_cog(cogs.CacherCog(bot, storage))
+    bot.add_cog(cogs.HelpCog(bot, BOT_COLOR))
+    bot.add_cog(cogs.LeaderboardCog(bot, BOT_COLOR))
+    bot.add_cog(cogs.QueueCog(bot, BOT_COLOR))
+    bot.get_cog('QueueCog').renderer.delay = args.render_delay
+    gateway = FakeGateway(bot)
+    rest = FakeREST(bot, gateway, latency=args.latency)
+    await bot.startup.run()
+
+    replay = Replay(bot, gateway)
+    elapsed = await replay.play(events, args.speed)
+    await replay.drain()
+    duration = events[-1]['t'] if events else 0.0
+    print(f'\n{len(events)} events recorded over {duration:.1f} s replayed in {elapsed:.2f} s '
+          f'({len(bot.guilds)} guilds, {replay.unmatched} reactions to posts not made in the replay)\n')
+    print(f'{"event":<22}{"count":>8}{"p50 (ms)":>10}{"p99 (ms)":>10}{"max (ms)":>10}')
+    summary = {'recording': args.recording, 'events': len(events), 'elapsed': elapsed, 'latency': {}, 'rest': {},
+               'outbound': dict(bot.outbound.stats)}
+
+    for name, samples in sorted(replay.latencies.items()):
+        p50, p99, worst = percentile(samples, 0.5), percentile(samples, 0.99), max(samples)
+        summary['latency'][name] = {'count': len(samples), 'p50': p50, 'p99': p99, 'max': worst}
+        print(f'{name:<22}{len(samples):>8}{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}{worst * 1000:>10.2f}')
+
+    print(f'\n{"REST call":<72}{"count":>8}')
+
+    for (method, path), count in rest.calls.most_common():
+        summary['rest'][f'{method} {path}'] = count
+        print(f'{method + " " + path:<72}{count:>8}')
+
+    print(f'{"total":<72}{rest.total:>8}')
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    bot.get_cog('CacherCog').periodic_save.cancel()
+    bot.get_cog('QueueCog').cog_unload()
+    bot.get_cog('LeaderboardCog').cog_unload()
+    await storage.close()
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('recording', help='traffic file written by RecorderCog')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed, 0 to replay without waiting')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds each fake REST call takes')
+    parser.add_argument('--render-delay', type=float, default=1.0, help='debounce delay of queue embed renders')
+    parser.add_argument('--summary', help='write the results as JSON to this path')
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
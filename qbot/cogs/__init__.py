@@ -3,11 +3,17 @@
 from .cacher import CacherCog
 from .console import ConsoleCog
 from .help import HelpCog
+from .leaderboard import LeaderboardCog
+from .metrics import MetricsCog
 from .queue import QueueCog
+from .recorder import RecorderCog
 
 __all__ = [
     CacherCog,
     ConsoleCog,
     HelpCog,
-    QueueCog
+    LeaderboardCog,
+    MetricsCog,
+    QueueCog,
+    RecorderCog
 ]
@@ -3,82 +3,166 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
-import json
-import os
+import logging
+import time
+
+from .utils.indexedqueue import IndexedQueue
+from .utils.log import log_event
+
+log = logging.getLogger('qbot.cacher')
+
+RESOLVE_BATCH = 100  # Most user IDs a single member query can ask for
+RESOLVE_CONCURRENCY = 4  # Guilds resolving members at the same time
 
 
 class CacherCog(commands.Cog):
     """ Cog to handle the caching of guild data. """
-    def __init__(self, bot, guild_data_file):
+    def __init__(self, bot, storage):
         self.bot = bot
-        self.guild_data_file = guild_data_file
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """ Load guild data and start saving task. """
-        # Wait for all other discord on_ready event handlers to finish
-        tasks = [t for t in asyncio.Task.all_tasks() if type(t) is discord.client._ClientEventTask]
-        tasks.remove(asyncio.Task.current_task())
-        await asyncio.wait(tasks)
-
-        # Load guild data
-        print('Loading guild data...')
-        self.load()
-        print('Loaded guild data')
+        self.storage = storage  # Storage backend guild data is persisted to
+        self.save_lock = asyncio.Lock()
+        self.compaction = None  # Task saving to compact the storage
+        self.last_save_duration = None  # Seconds the last save took
+        self.last_save_guilds = 0  # Number of guilds written by the last save
+        self.resolving = asyncio.Semaphore(RESOLVE_CONCURRENCY)  # Bounds guilds querying members at once
+        bot.startup.register('storage', self.open_storage)
+
+    async def open_storage(self):
+        """ Open the storage so guild data can be loaded and start the saving task. """
+        log.info('Opening guild data...')
+        await self.storage.open()
+        log.info('Opened guild data')
 
         # Start periodic save if it hasn't already begun
         if self.periodic_save.current_loop == 0:
             self.periodic_save.start()
 
-    def save(self):
-        """ Save guild data to JSON. """
-        data = {}
-        queue_cog = self.bot.get_cog('QueueCog')
-        mapdraft_cog = self.bot.get_cog('MapDraftCog')
-
-        # Save guild data for each guild
-        for guild in self.bot.guilds:
-            guild_queue = queue_cog.guild_queues.get(guild)
-            guild_mdraft = mapdraft_cog.guild_mdraft_data.get(guild)
-            guild_data = {}
-            guild_data['queue'] = {}
-            guild_data['queue']['active'] = [user.id for user in guild_queue.active]
-            guild_data['queue']['capacity'] = guild_queue.capacity
-
-            data[str(guild.id)] = guild_data
-
-        with open(self.guild_data_file, 'w+') as f:
-            json.dump(data, f)  # Dump dict to JSON
-
-    def load(self):
-        """ Load guild data from JSON. """
-        if not os.path.exists(self.guild_data_file):  # Check for guild data file first
-            return
-
-        queue_cog = self.bot.get_cog('QueueCog')
-        data = json.load(open(self.guild_data_file, 'r'))
-
-        for guild_id, guild_data in data.items():
-            guild = self.bot.get_guild(int(guild_id))
-
-            if guild is None:
-                continue
-
-            guild_queue = queue_cog.guild_queues.get(guild)
-
-            if guild_queue and 'queue' in guild_data:
-                guild_queue.capacity = guild_data['queue']['capacity']
-                active = guild_data['queue']['active']
-                guild_queue.active = [self.bot.get_user(id) for id in active if self.bot.get_user(id)]
+    @commands.Cog.listener()
+    async def on_queue_mutations(self, records):
+        """ Persist a batch of queue mutations and compact the storage if it asks for it. """
+        await self.storage.record_batch(records)
+        log_event(log, logging.DEBUG, 'Queue mutations', sample=0.01, guild=records[0]['g'],
+                  ops=[record['op'] for record in records])
+
+        if getattr(self.storage, 'needs_compaction', False) and self.compaction is None:
+            self.compaction = self.bot.loop.create_task(self.compact())
+
+    async def compact(self):
+        """ Save to compact the storage, with one compaction waiting for a save at a time. """
+        try:
+            await self.save(compacting=True)
+        finally:
+            self.compaction = None
+
+    @staticmethod
+    def guild_data(guild_queue):
+        """ Convert a QQueue to its persisted form. """
+        return {
+            'queue': {
+                'active': list(guild_queue.active),
+                'capacity': guild_queue.capacity,
+                'timeout': guild_queue.timeout,
+                'brownies': {str(user_id): list(entry) for user_id, entry in guild_queue.brownies.entries.items()},
+                'old_brownies': {str(user_id): list(entry) for user_id, entry in guild_queue.old_brownies.items()}
+            }
+        }
+
+    async def save(self, compacting=False):
+        """ Save guild data for the guilds that changed since the last save to the storage.
+
+        When compacting, the save is skipped if a save that finished while this one waited already compacted it.
+        """
+        async with self.save_lock:
+            if compacting and not getattr(self.storage, 'needs_compaction', False):
+                return
+
+            start = time.perf_counter()
+            queue_cog = self.bot.get_cog('QueueCog')
+            dirty = [(guild_id, queue) for guild_id, queue in queue_cog.guild_queues.items() if queue.dirty]
+            data = {}
+
+            for guild_id, guild_queue in dirty:
+                guild_queue.dirty = False  # Changes from here on are caught by the next save
+                data[str(guild_id)] = self.guild_data(guild_queue)
+
+            try:
+                await self.storage.save(data)
+            except Exception:
+                for _, guild_queue in dirty:
+                    guild_queue.dirty = True
+
+                raise
+
+            self.last_save_duration = time.perf_counter() - start
+            self.last_save_guilds = len(data)
+            log_event(log, logging.INFO, f'Saved guild data for {len(data)} guilds in '
+                      f'{self.last_save_duration * 1000:.1f} ms', guilds=len(data), duration=self.last_save_duration)
+
+    async def load_queue(self, guild, guild_queue):
+        """ Fill a guild's QQueue with its persisted data once the storage is ready.
+
+        Users are restored by ID whether or not they are in the member cache, so nobody loses their place after a cold
+        start. The members behind the IDs are then fetched into the cache in the background.
+        """
+        await self.bot.startup.wait('storage')
+        start = time.perf_counter()
+        guild_data = await self.storage.load_guild(guild.id)
+
+        if guild_data and 'queue' in guild_data:
+            guild_queue.capacity = guild_data['queue']['capacity']
+            guild_queue.timeout = guild_data['queue'].get('timeout')
+            guild_queue.active = IndexedQueue(guild_data['queue']['active'])
+
+            for user_id, entry in guild_data['queue'].get('brownies', {}).items():
+                guild_queue.brownies.restore(int(user_id), entry)
+
+            for user_id, entry in guild_data['queue'].get('old_brownies', {}).items():
+                old_entry = tuple(entry) if isinstance(entry, list) else (entry, time.time())
+                guild_queue.old_brownies[int(user_id)] = old_entry
+
+            user_ids = set(guild_queue.active) | set(guild_queue.brownies)
+            self.bot.loop.create_task(self.resolve_members(guild, user_ids, start))
+
+    async def resolve_members(self, guild, user_ids, start):
+        """ Fetch the uncached members of persisted user IDs a batch per gateway request and report the restore time.
+
+        IDs that can't be resolved stay in the queue as they are and are resolved on demand when they are needed.
+        """
+        missing = [user_id for user_id in user_ids if guild.get_member(user_id) is None]
+        resolved = len(user_ids) - len(missing)
+
+        if missing:
+            async with self.resolving:
+                for i in range(0, len(missing), RESOLVE_BATCH):
+                    try:
+                        members = await guild.query_members(user_ids=missing[i:i + RESOLVE_BATCH], limit=RESOLVE_BATCH,
+                                                            cache=True)
+                    except (asyncio.TimeoutError, discord.ClientException) as error:
+                        log.warning('Could not resolve members of guild %d: %r', guild.id, error)
+                        break
+
+                    resolved += len(members)
+
+        duration = time.perf_counter() - start
+        self.bot.dispatch('queue_restored', guild, duration)
+        log_event(log, logging.INFO, f'Restored guild {guild.id} in {duration * 1000:.1f} ms', guild=guild.id,
+                  users=len(user_ids), resolved=resolved, duration=duration)
+
+    async def top_brownies(self, guild_id, limit=10):
+        """ Get the (user ID, points) pairs with the most persisted brownie points in a guild. """
+        return await self.storage.top_brownies(guild_id, limit)
 
     @tasks.loop(minutes=10)
     async def periodic_save(self):
         """ Save guild data periodically. """
-        self.save()
-        print('Saved guild data')
+        await self.save()
 
     @commands.Cog.listener()
     async def on_disconenct(self):
         """ Save guild data on disconnect to be reloaded when ready. """
-        self.save()
-        print('Saved guild data')
+        await self.save()
+
+    def cog_unload(self):
+        """ Stop saving and release the storage when the cog is removed. """
+        self.periodic_save.cancel()
+        self.bot.loop.create_task(self.storage.close())
@@ -1,15 +1,20 @@
 # console.py
 
-import datetime
+import logging
 from discord.ext import commands
 
+from .utils.log import log_event
+
+log = logging.getLogger('qbot.console')
+
 
 class ConsoleCog(commands.Cog):
-    """ Does the console printing of the bot. """
+    """ Does the console logging of the bot. """
 
     def __init__(self, bot):
         """ Set bot attribute. """
         self.bot = bot
+        bot.startup.register('banner', self.log_banner, once=False)
 
     @property
     def startup_banner(self):
@@ -19,28 +24,23 @@ class ConsoleCog(commands.Cog):
         line = '=' * max(len(user_name), len(str(user_id)))
         return f'{line}\nLogged in as...\n{user_name}\n{user_id}\n{line}'
 
-    @staticmethod
-    def timestamp():
-        """ Easy timestamp generation. """
-        return datetime.datetime.now().strftime("%x - [%X]")
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """ Print basic bot info and server list and sets status on startup. """
-        print(self.startup_banner)
-        print(f'\nBot is online in {len(self.bot.guilds)} servers\n')
+    async def log_banner(self):
+        """ Log basic bot info and server count on startup. """
+        log.info('\n%s', self.startup_banner)
+        log_event(log, logging.INFO, f'Bot is online in {len(self.bot.guilds)} servers', guilds=len(self.bot.guilds))
 
     @commands.Cog.listener()
     async def on_command(self, ctx):
-        """ Print command calls to the console. """
-        print(f'{self.timestamp()}\n    Command: {ctx.command}\n    Sender:  {ctx.author}\n    Guild:   {ctx.guild}\n')
+        """ Log command calls. """
+        log_event(log, logging.INFO, f'Command: {ctx.command}  Sender: {ctx.author}  Guild: {ctx.guild}',
+                  command=str(ctx.command), user_id=ctx.author.id, guild_id=getattr(ctx.guild, 'id', None))
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
-        """ Print guild adds to the console. """
-        print(f'{self.timestamp()}\n    Bot has been added to guild: {guild}\n')
+        """ Log guild adds. """
+        log_event(log, logging.INFO, f'Bot has been added to guild: {guild}', guild_id=guild.id)
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
-        """ Print guild removes to the console. """
-        print(f'{self.timestamp()}\n    Bot has been removed from guild: {guild}\n')
+        """ Log guild removes. """
+        log_event(log, logging.INFO, f'Bot has been removed from guild: {guild}', guild_id=guild.id)
@@ -2,7 +2,9 @@
 
 import discord
 from discord.ext import commands
-import Levenshtein as lev
+
+from .utils.outbound import HIGH
+from .utils.suggest import CommandSuggester
 
 GITHUB = 'https://github.com/alrlchoa/acnh-water-bot'  # TODO: Use git API to get link to repo?
 
@@ -16,8 +18,27 @@ class HelpCog(commands.Cog):
         self.color = color
         self.logo = 'https://raw.githubusercontent.com/cameronshinn/csgo-queue-bot/master/assets/logo/rounded-logo.png'
         self.bot.remove_command('help')
+        self.suggester = CommandSuggester(bot)
+        self.embeds = {}  # Maps help embed title -> (commands version it was built for, embed)
+        self.info_embed = None
+        self.messages_seen = 0
+        self.messages_short_circuited = 0  # Messages on_message dismissed without doing any work
+        bot.startup.register('presence', self.set_presence, once=False)
 
     def help_embed(self, title):
+        """ Get the help embed, only rebuilding it when the bot's cogs or commands have changed. """
+        version = getattr(self.bot, 'commands_version', None)  # None for bots that don't track changes
+        cached = self.embeds.get(title)
+
+        if cached and version is not None and cached[0] == version:
+            return cached[1]
+
+        embed = self.build_help_embed(title)
+        self.embeds[title] = (version, embed)
+        return embed
+
+    def build_help_embed(self, title):
+        """ Build the help embed from the bot's cogs and commands. """
         embed = discord.Embed(title=title, color=self.color)
         prefix = self.bot.command_prefix
         prefix = prefix[0] if prefix is not str else prefix
@@ -31,58 +52,71 @@ class HelpCog(commands.Cog):
 
         return embed
 
-    @commands.Cog.listener()
-    async def on_ready(self):
+    async def set_presence(self):
         """ Set presence to let users know the help command. """
         activity = discord.Activity(type=discord.ActivityType.watching, name="noobs type q!help")
         await self.bot.change_presence(activity=activity)
 
     async def cog_before_invoke(self, ctx):
         """ Trigger typing at the start of every command. """
-        await ctx.trigger_typing()
+        self.bot.outbound.typing(ctx.channel)
+
+    async def reply(self, ctx, **kwargs):
+        """ Send a response to a command ahead of less important traffic. """
+        return await self.bot.outbound.run(ctx.channel.id, HIGH, lambda: ctx.send(**kwargs))
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
         """ Send help message when a mis-entered command is received. """
         if type(error) is commands.CommandNotFound:
-            # Get Levenshtein distance from commands
+            # Get the closest commands by Levenshtein distance
             in_cmd = ctx.invoked_with
-            bot_cmds = list(self.bot.commands)
-            lev_dists = [lev.distance(in_cmd, str(cmd)) / max(len(in_cmd), len(str(cmd))) for cmd in bot_cmds]
-            lev_min = min(lev_dists)
+            suggestions = self.suggester.suggest(in_cmd)
+            args = ctx.message.content[len(ctx.prefix) + len(in_cmd):]  # Keep what was typed after the command
 
             # Prep help message title
             embed_title = f'**```{ctx.message.content}```** is not valid!'
             prefix = self.bot.command_prefix
             prefix = prefix[0] if prefix is not str else prefix
 
-            # Make suggestion if lowest Levenshtein distance is under threshold
-            if lev_min <= 0.5:
-                embed_title += f' Did you mean `{prefix}{bot_cmds[lev_dists.index(lev_min)]}`?'
+            # Make suggestions if any are under the distance threshold
+            if suggestions:
+                suggestion_str = ' or '.join(f'`{prefix}{cmd}{args}`' for cmd in suggestions)
+                embed_title += f' Did you mean {suggestion_str}?'
             else:
                 embed_title += f' Use `{prefix}help` for a list of commands'
 
             embed = discord.Embed(title=embed_title, color=self.color)
-            await ctx.send(embed=embed)
+            await self.reply(ctx, embed=embed)
 
     @commands.command(brief='Display the help menu')  # TODO: Add 'or details of the specified command'
     async def help(self, ctx):
         """ Generate and send help embed based on the bot's commands. """
         embed = self.help_embed('__Queue Bot Commands__')
-        await ctx.send(embed=embed)
+        await self.reply(ctx, embed=embed)
 
     @commands.Cog.listener()
     async def on_message(self, message):
         """ Send the help embed if the bot is mentioned. """
+        self.messages_seen += 1
+
+        # Cheap prefilter: a mention of the bot always contains its ID in the raw content
+        if message.author.bot or self.bot.user is None or str(self.bot.user.id) not in message.content:
+            self.messages_short_circuited += 1
+            return
+
         if self.bot.user in message.mentions:
-            await message.channel.send(embed=self.help_embed('__Queue Bot Commands__'))
+            embed = self.help_embed('__Queue Bot Commands__')
+            await self.bot.outbound.run(message.channel.id, HIGH, lambda: message.channel.send(embed=embed))
 
     @commands.command(brief='Display basic info about this bot')
     async def info(self, ctx):
         """ Display the info embed. """
-        description = '_Your run-off-the-mill Gardening Bot'
+        if self.info_embed is None:  # Nothing in it changes so it is only built once
+            description = '_Your run-off-the-mill Gardening Bot'
+
+            description += f'\nSource code can be found [here]({GITHUB}) on GitHub'
+            self.info_embed = discord.Embed(title='__ACNH Water Bot__', description=description, color=self.color)
+            self.info_embed.set_thumbnail(url=self.logo)
 
-        description += f'\nSource code can be found [here]({GITHUB}) on GitHub'
-        embed = discord.Embed(title='__ACNH Water Bot__', description=description, color=self.color)
-        embed.set_thumbnail(url=self.logo)
-        await ctx.send(embed=embed)
+        await self.reply(ctx, embed=self.info_embed)
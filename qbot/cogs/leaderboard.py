@@ -0,0 +1,173 @@
+# leaderboard.py
+
+import datetime
+import discord
+from discord.ext import commands, tasks
+import logging
+import time
+
+from .utils.decay import decayed, score
+from .utils.outbound import HIGH
+from .utils.ranking import RankIndex
+
+log = logging.getLogger('qbot.leaderboard')
+
+TOP_SIZE = 10  # Users shown on a leaderboard
+SNAPSHOT_SIZE = 25  # Users recorded per guild and across guilds in each snapshot
+HISTORY_SIZE = 10  # Snapshots shown by the history command
+
+
+class LeaderboardCog(commands.Cog):
+    """ Ranks users by brownie points in each guild and across guilds and snapshots the rankings periodically.
+
+    Rankings are ordered by the time-independent decay score of each balance, so they stay in order as points decay
+    and only need updating when points change, which the cog picks up from the published queue mutations.
+    """
+
+    def __init__(self, bot, color):
+        """ Set attributes. """
+        self.bot = bot
+        self.color = color
+        self.guild_ranks = {}  # Maps guild ID -> RankIndex of user IDs
+        self.global_ranks = RankIndex()  # Ranks (guild ID, user ID) pairs across all guilds
+        self.entries = {}  # Maps (guild ID, user ID) -> (points, anchor) of every ranked balance
+        self.loaded = False  # Whether the persisted balances have been indexed
+        self.changed = set()  # (guild ID, user ID) pairs updated by mutations before loading finished
+        bot.startup.register('leaderboard', self.load, requires=('storage',))
+
+    async def load(self):
+        """ Index the persisted balances once the storage is open and start taking snapshots. """
+        start = time.perf_counter()
+
+        for guild_id, user_id, entry in await self.bot.get_cog('CacherCog').storage.brownie_entries():
+            if (guild_id, user_id) not in self.changed:  # Mutations since are newer than what was persisted
+                self.update(guild_id, user_id, entry)
+
+        self.changed.clear()
+        self.loaded = True
+        log.info('Ranked %d brownie balances in %.1f ms', len(self.entries), (time.perf_counter() - start) * 1000)
+
+        if self.snapshot.current_loop == 0:
+            self.snapshot.start()
+
+    def update(self, guild_id, user_id, entry):
+        """ Rank a user's balance in a guild by its entry or stop ranking it if the entry is None. """
+        key = (guild_id, user_id)
+
+        if entry is None:
+            self.entries.pop(key, None)
+            self.global_ranks.discard(key)
+            ranks = self.guild_ranks.get(guild_id)
+
+            if ranks is not None:
+                ranks.discard(user_id)
+
+                if not ranks:
+                    del self.guild_ranks[guild_id]
+        else:
+            entry = tuple(entry)
+            self.entries[key] = entry
+            self.global_ranks.set(key, score(entry))
+            self.guild_ranks.setdefault(guild_id, RankIndex()).set(user_id, score(entry))
+
+    @commands.Cog.listener()
+    async def on_queue_mutations(self, records):
+        """ Re-rank the users whose points changed. """
+        for record in records:
+            if record['op'] == 'pts':
+                self.update(record['g'], record['u'], record['v'])
+
+                if not self.loaded:
+                    self.changed.add((record['g'], record['u']))
+
+    def points(self, guild_id, user_id, now):
+        """ Get the current points of a ranked balance. """
+        return decayed(self.entries[guild_id, user_id], now)
+
+    def standing(self, guild_id, user_id):
+        """ Get a user's one-based rank in a guild and across guilds with the sizes of both, ranks None if unranked. """
+        ranks = self.guild_ranks.get(guild_id)
+        guild_rank = ranks.rank(user_id) if ranks is not None else None
+        global_rank = self.global_ranks.rank((guild_id, user_id))
+        return (None if guild_rank is None else guild_rank + 1, len(ranks or ()),
+                None if global_rank is None else global_rank + 1, len(self.global_ranks))
+
+    def top(self, guild_id=None, limit=TOP_SIZE):
+        """ Get up to limit (guild ID, user ID, current points) of a guild or of all guilds if None, highest first. """
+        now = time.time()
+
+        if guild_id is None:
+            return [(g, u, self.points(g, u, now)) for (g, u), _ in self.global_ranks.top(limit)]
+
+        ranks = self.guild_ranks.get(guild_id)
+        return [(guild_id, u, self.points(guild_id, u, now)) for u, _ in ranks.top(limit)] if ranks else []
+
+    @tasks.loop(hours=1)
+    async def snapshot(self):
+        """ Persist the top of every guild's ranking and of the ranking across guilds. """
+        rows = [(None, rank, user_id, points)
+                for rank, (guild_id, user_id, points) in enumerate(self.top(None, SNAPSHOT_SIZE), start=1)]
+
+        for guild_id in self.guild_ranks:
+            rows.extend((guild_id, rank, user_id, points)
+                        for rank, (_, user_id, points) in enumerate(self.top(guild_id, SNAPSHOT_SIZE), start=1))
+
+        if rows:
+            await self.bot.get_cog('CacherCog').storage.save_snapshot(time.time(), rows)
+
+    async def reply(self, ctx, **kwargs):
+        """ Send a response to a command ahead of less important traffic. """
+        return await self.bot.outbound.run(ctx.channel.id, HIGH, lambda: ctx.send(**kwargs))
+
+    @commands.command(usage='leaderboard [global]', aliases=['top'],
+                      brief='Display who has the most brownie points here or across all servers')
+    async def leaderboard(self, ctx, scope=None):
+        """ Display the top of the brownie point ranking of the guild or of all guilds. """
+        across = scope is not None and scope.lower() in ('global', 'all')
+        top = self.top(None if across else ctx.guild.id)
+        lines = []
+
+        for rank, (guild_id, user_id, points) in enumerate(top, start=1):
+            line = f'{rank}. <@{user_id}> {points} brownies'
+
+            if across:
+                guild = self.bot.get_guild(guild_id)
+                line += f' in {guild.name if guild else "another server"}'
+
+            lines.append(line)
+
+        title = 'Top helpers across servers' if across else 'Top helpers'
+        description = '\n'.join(lines) or '_Nobody has brownie points yet..._'
+        await self.reply(ctx, embed=discord.Embed(title=title, description=description, color=self.color))
+
+    @commands.command(usage='rank [user mention]', brief='Display where you or the mentioned user rank by brownies')
+    async def rank(self, ctx):
+        """ Display a user's brownie point rank in the guild and across guilds. """
+        member = ctx.message.mentions[0] if ctx.message.mentions else ctx.author
+        guild_rank, guild_size, global_rank, global_size = self.standing(ctx.guild.id, member.id)
+
+        if guild_rank is None:
+            title = f'**{member.display_name}** has no brownie points'
+        else:
+            points = self.points(ctx.guild.id, member.id, time.time())
+            title = (f'**{member.display_name}** has {points} brownies, ranking #{guild_rank} of {guild_size} here '
+                     f'and #{global_rank} of {global_size} across servers')
+
+        await self.reply(ctx, embed=discord.Embed(title=title, color=self.color))
+
+    @commands.command(usage='history [user mention]',
+                      brief='Display how you or the mentioned user ranked in recent leaderboard snapshots')
+    async def history(self, ctx):
+        """ Display a user's rank and points in the latest snapshots they were in. """
+        member = ctx.message.mentions[0] if ctx.message.mentions else ctx.author
+        storage = self.bot.get_cog('CacherCog').storage
+        history = (await storage.snapshot_history(ctx.guild.id, member.id))[-HISTORY_SIZE:]
+        lines = [f'{datetime.datetime.fromtimestamp(taken_at):%Y-%m-%d %H:%M} #{rank} with {points} brownies'
+                 for taken_at, rank, points in history]
+        title = f'Leaderboard history of {member.display_name}'
+        description = '\n'.join(lines) or '_Not in any leaderboard snapshot yet..._'
+        await self.reply(ctx, embed=discord.Embed(title=title, description=description, color=self.color))
+
+    def cog_unload(self):
+        """ Stop taking snapshots when the cog is removed. """
+        self.snapshot.cancel()
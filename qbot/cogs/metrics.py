@@ -0,0 +1,181 @@
+# metrics.py
+
+from aiohttp import web
+from contextvars import ContextVar
+from discord.ext import commands
+import asyncio
+import logging
+import time
+
+from .utils.metrics import Registry
+
+log = logging.getLogger('qbot.metrics')
+
+# (command name, guild ID) of the invocation the current task was started from, inherited by tasks it creates
+current_invocation = ContextVar('current_invocation', default=(None, None))
+
+REST_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class MetricsCog(commands.Cog):
+    """ Cog to instrument command invocations and REST calls and serve the metrics to Prometheus. """
+
+    def __init__(self, bot, host='127.0.0.1', port=9090, lag_interval=1.0):
+        """ Set attributes and wrap the bot's invoke and HTTP request methods. """
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.lag_interval = lag_interval
+        self.runner = None
+        self.lag_task = None
+        self.registry = registry = Registry()
+        self.commands = registry.counter('qbot_commands_total', 'Commands invoked', ('command', 'guild', 'status'))
+        self.command_latency = registry.histogram('qbot_command_latency_seconds',
+                                                  'End to end command latency including hooks and error handling',
+                                                  ('command', 'guild', 'status'))
+        self.rest_calls = registry.counter('qbot_rest_calls_total', 'Discord REST calls made',
+                                           ('method', 'route', 'command', 'guild'))
+        self.rest_errors = registry.counter('qbot_rest_errors_total', 'Discord REST calls that raised',
+                                            ('method', 'route'))
+        self.rest_latency = registry.histogram('qbot_rest_latency_seconds', 'Discord REST call latency',
+                                               ('method', 'route'), REST_BUCKETS)
+        self.loop_lag = registry.histogram('qbot_event_loop_lag_seconds', 'Event loop scheduling delay',
+                                           buckets=LAG_BUCKETS)
+        self.loop_lag_last = registry.gauge('qbot_event_loop_lag_last_seconds', 'Most recent event loop lag')
+        self.guilds = registry.gauge('qbot_guilds', 'Guilds the bot is in')
+        self.loaded_queues = registry.gauge('qbot_loaded_queues', 'Guild queues loaded in memory')
+        self.timers = registry.gauge('qbot_pending_timers', 'Timers pending on the queue timer wheel')
+        self.renders = registry.counter('qbot_renders_total', 'Queue post render outcomes', ('outcome',))
+        self.dms = registry.counter('qbot_dms_total', 'Direct message outcomes', ('outcome',))
+        self.mailbox = registry.counter('qbot_queue_mailbox_total', 'Queue mutations and those that waited on another',
+                                        ('kind',))
+        self.outbound = registry.counter('qbot_outbound_total', 'Outbound call outcomes', ('outcome',))
+        self.outbound_backlog = registry.gauge('qbot_outbound_backlog', 'Outbound calls waiting to be made')
+        self.last_save = registry.gauge('qbot_last_save_seconds', 'Duration of the last guild data save')
+        self.restores = registry.histogram('qbot_guild_restore_seconds',
+                                           'Time to load a guild queue and resolve its persisted members')
+        self.last_save_guilds = registry.gauge('qbot_last_save_guilds', 'Guilds written by the last save')
+        self.startup_steps = registry.gauge('qbot_startup_step_seconds', 'Duration of the last run of startup steps',
+                                            ('step',))
+        registry.collectors.append(self.collect)
+
+        self.original_invoke = bot.invoke
+        self.original_request = bot.http.request
+        bot.invoke = self.invoke
+        bot.http.request = self.request
+        bot.startup.register('metrics', self.start_serving)
+
+    def cog_unload(self):
+        """ Restore the wrapped methods and stop serving metrics. """
+        self.bot.invoke = self.original_invoke
+        self.bot.http.request = self.original_request
+
+        if self.lag_task:
+            self.lag_task.cancel()
+
+        if self.runner:
+            self.bot.loop.create_task(self.runner.cleanup())
+
+    async def invoke(self, ctx):
+        """ Time a command invocation from its checks through to its error handling. """
+        if ctx.command is None:  # Not a command, nothing to time
+            return await self.original_invoke(ctx)
+
+        command = ctx.command.qualified_name
+        guild = ctx.guild.id if ctx.guild else None
+        current_invocation.set((command, guild))
+        start = time.perf_counter()
+
+        try:
+            await self.original_invoke(ctx)
+        finally:
+            status = 'error' if ctx.command_failed else 'ok'
+            self.command_latency.observe(time.perf_counter() - start, command, guild, status)
+            self.commands.inc(command, guild, status)
+
+    async def request(self, route, **kwargs):
+        """ Count and time a REST call, attributing it to the command that caused it. """
+        command, guild = current_invocation.get()
+        self.rest_calls.inc(route.method, route.path, command, guild)
+        start = time.perf_counter()
+
+        try:
+            return await self.original_request(route, **kwargs)
+        except Exception:
+            self.rest_errors.inc(route.method, route.path)
+            raise
+        finally:
+            self.rest_latency.observe(time.perf_counter() - start, route.method, route.path)
+
+    def collect(self):
+        """ Refresh the metrics mirrored from other cogs. """
+        self.guilds.set(len(self.bot.guilds))
+        startup = getattr(self.bot, 'startup', None)
+
+        if startup:
+            for step, (_, duration) in startup.timings.items():
+                self.startup_steps.set(duration, step)
+
+        outbound = getattr(self.bot, 'outbound', None)
+
+        if outbound:
+            self.outbound_backlog.set(outbound.backlog)
+
+            for outcome, count in outbound.stats.items():
+                self.outbound.set(count, outcome)
+
+        queue_cog = self.bot.get_cog('QueueCog')
+
+        if queue_cog:
+            self.loaded_queues.set(len(queue_cog.guild_queues))
+            self.timers.set(len(queue_cog.timers))
+
+            for outcome, count in queue_cog.renderer.stats.items():
+                self.renders.set(count, outcome)
+
+            for outcome, count in queue_cog.dms.stats.items():
+                self.dms.set(count, outcome)
+
+            for kind, count in queue_cog.mailbox.stats.items():
+                self.mailbox.set(count, kind)
+
+        cacher_cog = self.bot.get_cog('CacherCog')
+
+        if cacher_cog and cacher_cog.last_save_duration is not None:
+            self.last_save.set(cacher_cog.last_save_duration)
+            self.last_save_guilds.set(cacher_cog.last_save_guilds)
+
+    async def measure_lag(self):
+        """ Measure how late the event loop wakes a sleeping task. """
+        loop = asyncio.get_event_loop()
+
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - start - self.lag_interval)
+            self.loop_lag.observe(lag)
+            self.loop_lag_last.set(lag)
+
+    async def serve_metrics(self, request):
+        """ Respond with the metrics in the Prometheus text format. """
+        return web.Response(body=self.registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    @commands.Cog.listener()
+    async def on_queue_restored(self, guild, duration):
+        """ Record how long restoring a guild's persisted queue took. """
+        self.restores.observe(duration)
+
+    async def start_serving(self):
+        """ Start measuring loop lag and serving metrics if they haven't already begun. """
+        if self.lag_task is None:
+            self.lag_task = self.bot.loop.create_task(self.measure_lag())
+
+        if self.runner is None:
+            app = web.Application()
+            app.router.add_get('/metrics', self.serve_metrics)
+            self.runner = web.AppRunner(app, access_log=None)
+            await self.runner.setup()
+            await web.TCPSite(self.runner, self.host, self.port).start()
+            log.info('Serving metrics on http://%s:%d/metrics', self.host, self.port)
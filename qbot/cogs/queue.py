@@ -1,7 +1,27 @@
 # queue.py
 
+import asyncio
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
+import logging
+
+from .utils.decay import DecayingPoints
+from .utils.dm import DMDispatcher
+from .utils.indexedqueue import IndexedQueue
+from .utils.mailbox import Mailbox
+from .utils.outbound import CRITICAL, HIGH, NORMAL
+from .utils.pages import PagedLines, page_count
+from .utils.render import RenderScheduler
+from .utils.startup import StartupError
+from .utils.suggest import MAX_CAPACITY, MIN_CAPACITY, suggest_argument
+from .utils.timerwheel import TimerWheel
+from .utils.ttlcache import TTLCache
+
+log = logging.getLogger('qbot.queue')
+
+MAINTENANCE_INTERVAL = 600  # Seconds between maintenance runs of each guild
+ANNOUNCEMENT_TTL = 24 * 60 * 60  # Seconds reactions to a Dodo post are handled for
+MAX_ANNOUNCEMENTS = 10000  # Dodo posts indexed across all guilds
 
 
 class Iconography:
@@ -22,28 +42,47 @@ distress = Iconography('Distress Signal', '<:distress:708350808714117201>', f'{B
 
 class Announcement:
     """A group of attributes representing the current running post. Needed to keep track of current poster."""
-    def __init__(self, message=None, host=None):
-        self.message = message
-        self.host = host
+
+    __slots__ = ('message_id', 'channel_id', 'host_id')
+
+    def __init__(self, message_id, channel_id, host_id):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.host_id = host_id
 
 class QQueue:
-    """ Queue class for the bot. """
+    """ Queue class for the bot. Users are referred to by their IDs so no Discord objects are kept alive. """
+
+    __slots__ = ('active', 'capacity', 'timeout', 'curr_posts', 'brownies', 'old_brownies', 'dirty',
+                 'maintenance_timer', 'timed_head', 'head_timer', 'lines')
 
-    def __init__(self, active=None, capacity=10, timeout=None, last_msg=None):
+    def __init__(self, active=None, capacity=10, timeout=None):
         """ Set attributes. """
         # Assign empty lists inside function to make them unique to objects
-        self.active = [] if active is None else active  # List of players in the queue
+        self.active = IndexedQueue(active)  # Ordered user IDs of the players in the queue
         self.capacity = capacity  # Max queue size
-        # self.timeout = timeout  # Number of minutes of inactivity after which to empty the queue
-        self.last_msg = last_msg  # Last sent confirmation message for the join command
-        self.curr_posts = []
-        self.brownies = {} #Brownie point counter?
-        self.old_brownies = {}
+        self.timeout = timeout  # Minutes the head of the queue can be inactive before being removed (None for never)
+        self.curr_posts = []  # Announcements of the latest Dodo posts
+        self.brownies = DecayingPoints()  # Brownie points of each user ID, decaying over time
+        self.old_brownies = {}  # Maps user ID -> (points, anchor) to restore if a watering reaction is removed
+        self.dirty = False  # Whether there are changes since the last save
+        self.maintenance_timer = None  # Timer of the next maintenance run
+        self.timed_head = None  # ID of the user the inactivity timeout is currently running for
+        self.head_timer = None  # Timer that removes the head of the queue for inactivity
+        self.lines = PagedLines()  # Cached embed lines of the queue entries
 
     @property
     def is_default(self):
         """ Indicate whether the QQueue has any non-default values. """
-        return self.active == [] and self.capacity == 10
+        return len(self.active) == 0 and self.capacity == 10 and self.timeout is None
+
+    def cancel_timers(self):
+        """ Cancel the maintenance and inactivity timers of the queue. """
+        for timer in (self.maintenance_timer, self.head_timer):
+            if timer:
+                timer.cancel()
+
+        self.maintenance_timer = self.head_timer = self.timed_head = None
 
 
 class QueueCog(commands.Cog):
@@ -52,158 +91,416 @@ class QueueCog(commands.Cog):
     def __init__(self, bot, color):
         """ Set attributes. """
         self.bot = bot
-        self.guild_queues = {}  # Maps Guild -> QQueue
+        self.guild_queues = {}  # Maps guild ID -> QQueue (only for guilds that have been accessed)
+        self.hydrating = {}  # Maps guild ID -> task loading its QQueue
+        self.renderer = RenderScheduler(outbound=bot.outbound)  # Coalesces queue embed updates per guild
+        self.dms = DMDispatcher(self.fetch_user)  # Delivers warnings and removal notices without blocking
+        self.timers = TimerWheel()  # Schedules point checks, maintenance and inactivity timeouts of all guilds
+        self.point_checks = {}  # Maps (guild ID, user ID) -> timer of the next brownie threshold check
+        self.announcements = TTLCache(MAX_ANNOUNCEMENTS, ANNOUNCEMENT_TTL)  # Maps message ID -> Announcement
+        self.mailbox = Mailbox()  # Applies the queue mutations of each guild one at a time
+        self.unpublished = {}  # Maps guild ID -> queue mutation records to dispatch at the end of the loop iteration
         self.color = color
-        self.queue_maintenance.start()
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        """ Initialize an empty list for each guild the bot is in. """
-        for guild in self.bot.guilds:
-            if guild not in self.guild_queues:  # Don't add empty queue if guild already loaded
-                self.guild_queues[guild] = QQueue()
-               
+    def cog_unload(self):
+        """ Stop background work when the cog is removed. """
+        self.timers.stop()
+        self.dms.stop()
 
-    @commands.Cog.listener()
-    async def on_guild_join(self, guild):
-        """ Initialize an empty list for guilds that are added. """
-        self.guild_queues[guild] = QQueue()
+    def spawn(self, coro_func, *args):
+        """ Timer callback to run a coroutine function as a task. """
+        self.bot.loop.create_task(coro_func(*args))
+
+    async def fetch_user(self, user_id):
+        """ Get a user from the cache or the API if they aren't cached. """
+        return self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+
+    async def hydrate(self, guild):
+        """ Create a guild's QQueue and fill it with persisted data from the CacherCog if there is any. """
+        queue = QQueue()
+        cacher = self.bot.get_cog('CacherCog')
+
+        try:
+            if cacher:
+                await cacher.load_queue(guild, queue)
+
+            self.guild_queues[guild.id] = queue
+
+            for user_id in queue.brownies:  # Pick up the decay of persisted points
+                self.schedule_point_check(guild.id, user_id)
+
+            # Stagger maintenance across guilds by their IDs so they don't all run at once
+            queue.maintenance_timer = self.timers.schedule_in(guild.id % MAINTENANCE_INTERVAL, self.spawn, self.mutate,
+                                                              guild.id, self.maintain, guild.id)
+            self.watch_head(guild.id)
+        finally:
+            self.hydrating.pop(guild.id, None)
+
+    async def get_queue(self, guild):
+        """ Get the QQueue of a guild, hydrating it on first access. """
+        queue = self.guild_queues.get(guild.id)
+
+        if queue is None:
+            if guild.id not in self.hydrating:  # Concurrent first accesses share a single load
+                self.hydrating[guild.id] = self.bot.loop.create_task(self.hydrate(guild))
+
+            await asyncio.shield(self.hydrating[guild.id])
+            queue = self.guild_queues[guild.id]
+
+        return queue
+
+    def maintain(self, guild_id):
+        """ Periodic upkeep of a guild: drop stale point snapshots and unload its state if it is idle. """
+        queue = self.guild_queues.get(guild_id)
+
+        if queue is None:
+            return
+
+        for user_id in [user_id for user_id in queue.old_brownies if user_id not in queue.brownies]:
+            del queue.old_brownies[user_id]
+
+        queue.curr_posts = [post for post in queue.curr_posts if post.message_id in self.announcements]
+
+        idle = not (queue.active or queue.brownies or queue.curr_posts or queue.dirty)
+        rendering = guild_id in self.renderer.pending or guild_id in self.renderer.tasks  # Renders read the queue
+
+        if idle and not rendering and self.bot.get_cog('CacherCog'):  # Persisted state is hydrated again on next access
+            self.unload(guild_id)
+        else:
+            queue.maintenance_timer = self.timers.schedule_in(MAINTENANCE_INTERVAL, self.spawn, self.mutate, guild_id,
+                                                              self.maintain, guild_id)
+
+    def unload(self, guild_id):
+        """ Drop the in-memory state of a guild. """
+        queue = self.guild_queues.pop(guild_id, None)
+
+        if queue:
+            queue.cancel_timers()
+
+    def watch_head(self, guild_id, reset=False):
+        """ (Re)start the inactivity timeout when the head of the queue changes or resets it with activity. """
+        queue = self.guild_queues[guild_id]
+        head = queue.active.head
+
+        if head == queue.timed_head and not reset:
+            return
+
+        if queue.head_timer:
+            queue.head_timer.cancel()
+            queue.head_timer = None
+
+        queue.timed_head = head
+
+        if head is not None and queue.timeout:
+            queue.head_timer = self.timers.schedule_in(queue.timeout * 60, self.spawn, self.timeout_head, guild_id,
+                                                       head)
+
+    def expire_head(self, guild_id, user_id):
+        """ Remove the head of the queue if they are still at the front and get the new front of the queue. """
+        queue = self.guild_queues.get(guild_id)
+
+        if queue is None or queue.active.head != user_id:
+            return None
+
+        queue.head_timer = None
+        queue.active.remove(user_id)
+        queue.brownies.pop(user_id, None)
+        queue.old_brownies.pop(user_id, None)
+        self.journal(guild_id, 'del', u=user_id)
+        self.journal_points(guild_id, user_id)
+        return queue.active[:2]
+
+    async def timeout_head(self, guild_id, user_id):
+        """ Remove the head of the queue after they've been inactive for the queue timeout. """
+        head_ids = await self.mutate(guild_id, self.expire_head, guild_id, user_id)
+
+        if head_ids is None:
+            return
+
+        queue = self.guild_queues.get(guild_id)
+
+        if queue is None:  # Unloaded while the mutation was waiting
+            return
+
+        self.dms.send(user_id, f"You've been at the front of the queue for {queue.timeout} minutes without any "
+                               "activity, so you've been removed. Feel free to q!join again!")
+        post = self.renderer.posts.get(guild_id)
+        channel = post and self.bot.get_channel(post.channel_id)
+
+        if channel:  # Show the change where the queue was last displayed
+            member = channel.guild.get_member(user_id)
+            title = f'**{member.display_name if member else "The front of the queue"}** timed out'
+            self.renderer.schedule(guild_id, channel, lambda: self.queue_embed(guild_id, title))
+            await self.announce_head(channel, head_ids)
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
         """ Remove queue list when a guild is removed. """
-        self.guild_queues.pop(guild)
+        self.unload(guild.id)
+        self.renderer.forget(guild.id)
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """ Track channel activity so queue embeds are only re-posted once they scroll away. """
+        self.renderer.note_message(message)
 
     async def cog_before_invoke(self, ctx):
-        """ Trigger typing at the start of every command. """
-        await ctx.trigger_typing()
+        """ Trigger typing and make sure the guild queue is loaded at the start of every command. """
+        self.bot.outbound.typing(ctx.channel)
+
+        if ctx.guild:
+            try:
+                queue = await self.get_queue(ctx.guild)
+            except StartupError as error:  # The storage couldn't be opened, so the queue can't be loaded
+                title = 'The queue is unavailable right now, please try again later'
+                await self.reply(ctx, embed=discord.Embed(title=title, color=self.color))
+                raise commands.CommandError(str(error)) from error
+
+            if ctx.author.id == queue.active.head:  # Activity from the head of the queue resets their timeout
+                self.watch_head(ctx.guild.id, reset=True)
 
-    def queue_embed(self, guild, title=None):
-        """"""
-        queue = self.guild_queues[guild]
+    def queue_embed(self, guild_id, title=None, page=0):
+        """ Build the embed of a zero-based page of the guild's queue, None if the queue has been unloaded. """
+        queue = self.guild_queues.get(guild_id)
+
+        if queue is None:
+            return None
+
+        pages = page_count(len(queue.active))
+        page = min(page, pages - 1)  # The queue may have shrunk since the page was asked for
 
         if title:
             title += f' ({len(queue.active)}/{queue.capacity})'
 
-        if queue.active != []:  # If there are users in the queue
-            queue_str = ''.join(f'{e_usr[0]}. {e_usr[1].mention}\n' for e_usr in enumerate(queue.active, start=1))
+        if queue.active:  # If there are users in the queue
+            queue_str = queue.lines.page(queue.active, page)
         else:  # No users in queue
             queue_str = '_The queue is empty..._'
 
+        footer = 'Players will receive a notification when the queue fills up'
+
+        if pages > 1:
+            footer = f'Page {page + 1} of {pages}, use view <page> for the others. {footer}'
+
         embed = discord.Embed(title=title, description=queue_str, color=self.color)
-        embed.set_footer(text='Players will receive a notification when the queue fills up')
+        embed.set_footer(text=footer)
         return embed
+
+    def position_embed(self, guild_id, user_id):
+        """ Build a compact embed of the front of the guild's queue and where a user is in it. """
+        queue = self.guild_queues[guild_id]
+        title = f'Players in queue ({len(queue.active)}/{queue.capacity})'
+
+        if not queue.active:
+            description = '_The queue is empty..._'
+        elif user_id not in queue.active:
+            description = queue.lines.line(queue.active, 0) + "_You aren't in the queue_"
+        else:
+            place = queue.active.index(user_id)
+            description = queue.lines.line(queue.active, 0)
+
+            if place > 1:
+                description += '...\n'
+            if place > 0:
+                description += queue.lines.line(queue.active, place)
+
+        return discord.Embed(title=title, description=description, color=self.color)
+
+    def refresh(self, ctx, title):
+        """ Schedule an update of the guild's queue embed in the context's channel. """
+        guild_id = ctx.guild.id
+        self.renderer.schedule(guild_id, ctx.channel, lambda: self.queue_embed(guild_id, title))
+
+    async def reply(self, ctx, *args, **kwargs):
+        """ Send a response to a command ahead of less important traffic. """
+        return await self.bot.outbound.run(ctx.channel.id, HIGH, lambda: ctx.send(*args, **kwargs))
+
+    async def announce_head(self, channel, head_ids):
+        """ Let the new front of the queue know they're up and the next in line to get ready. """
+        if len(head_ids) > 0:
+            text = f"<@{head_ids[0]}>, you're good to go!"
+            await self.bot.outbound.run(channel.id, CRITICAL, lambda: channel.send(text))
+        if len(head_ids) > 1:
+            text = f"<@{head_ids[1]}>, please be on deck with your Dodo Code!"
+            await self.bot.outbound.run(channel.id, CRITICAL, lambda: channel.send(text))
+
+    async def mutate(self, guild_id, operation, *args):
+        """ Apply a change to a guild's queue after the ones submitted before it and return the operation's result. """
+        return await self.mailbox.submit(guild_id, operation, *args)
+
+    def publish(self, guild_id):
+        """ Dispatch a guild's unpublished mutations together so the CacherCog can journal them in one write.
+
+        Mutations are published once the current loop iteration is done, so all those made to a guild by the commands,
+        reactions and timers handled in the same iteration go out as one batch.
+        """
+        records = self.unpublished.pop(guild_id, None)
+
+        if records:
+            self.bot.dispatch('queue_mutations', records)
+
+    def journal(self, guild_id, op, **fields):
+        """ Mark the guild queue as changed and queue the mutation to be published for the CacherCog to journal. """
+        self.guild_queues[guild_id].dirty = True
+
+        if guild_id not in self.unpublished:  # First mutation of the batch
+            self.unpublished[guild_id] = []
+            self.bot.loop.call_soon(self.publish, guild_id)
+
+        self.unpublished[guild_id].append({'g': guild_id, 'op': op, **fields})
+
+        self.watch_head(guild_id)
+
+    def journal_points(self, guild_id, user_id):
+        """ Publish the current brownie points of a user (None if they are no longer tracked). """
+        queue = self.guild_queues[guild_id]
+        points = queue.brownies.entry(user_id) if user_id in queue.brownies else None
+        self.journal(guild_id, 'pts', u=user_id, v=points, o=queue.old_brownies.get(user_id))
+        self.schedule_point_check(guild_id, user_id)
+
+    def schedule_point_check(self, guild_id, user_id):
+        """ Schedule the next check of a user's decaying points against the warning and removal thresholds. """
+        key = (guild_id, user_id)
+        timer = self.point_checks.pop(key, None)
+
+        if timer:
+            timer.cancel()
+
+        queue = self.guild_queues.get(guild_id)
+
+        if queue and user_id in queue.brownies:
+            deadline = queue.brownies.next_check(user_id, -2)
+            self.point_checks[key] = self.timers.schedule(deadline, self.spawn, self.mutate, guild_id,
+                                                          self.check_points, guild_id, user_id)
+
+    async def check_points(self, guild_id, user_id):
+        """ Warn or remove a user whose points have decayed past the thresholds and schedule the next check. """
+        self.point_checks.pop((guild_id, user_id), None)
+        queue = self.guild_queues.get(guild_id)
+
+        if queue and user_id in queue.brownies:
+            if queue.brownies[user_id] <= -2:
+                await self.clear_user(guild_id, user_id)
+
+            self.schedule_point_check(guild_id, user_id)
     
-    def add_points(self,user):
+    def add_points(self, guild_id, user_id):
         """Add a brownie point for volunteering to water"""
-        queue = self.guild_queues[user.guild]
-        if user in queue.brownies:
-            if queue.brownies[user] < -3:
-                queue.old_brownies[user] = queue.brownies[user]
-                queue.brownies[user] += 3
-            else:
-                queue.brownies[user] += 2
+        queue = self.guild_queues[guild_id]
+        if user_id in queue.brownies:
+            queue.old_brownies[user_id] = queue.brownies.entry(user_id)
+            queue.brownies.add(user_id, 3 if queue.brownies[user_id] < -3 else 2)
         else:
-            queue.old_brownies[user] = 0
-            queue.brownies[user] = 0
+            queue.brownies.set(user_id, 0)
+            queue.old_brownies[user_id] = queue.brownies.entry(user_id)
+        self.journal_points(guild_id, user_id)
         return
     
-    async def remove_points(self,user):
-        """Add a brownie point for volunteering to water"""
-        queue = self.guild_queues[user.guild]
-        if user in queue.brownies:
-            queue.old_brownies[user] = queue.brownies[user]
-            queue.brownies[user] -= 1
-            if queue.brownies[user] <= -2:
-                await self.clear_user(user)
+    async def remove_points(self, guild_id, user_id):
+        """Take away a brownie point on top of the decay over time"""
+        queue = self.guild_queues[guild_id]
+        if user_id in queue.brownies:
+            queue.old_brownies[user_id] = queue.brownies.entry(user_id)
+            queue.brownies.add(user_id, -1)
+            self.journal_points(guild_id, user_id)
+            if queue.brownies[user_id] <= -2:
+                await self.clear_user(guild_id, user_id)
         else:
-            queue.old_brownies[user] = 0
-            queue.brownies[user] = 0
+            queue.brownies.set(user_id, 0)
+            queue.old_brownies[user_id] = queue.brownies.entry(user_id)
+            self.journal_points(guild_id, user_id)
         return
     
-    async def emergency_slide(self, ctx):
+    async def emergency_slide(self, channel, user):
         """Push poster of this post to second in queue or higher. Distress Signal"""
-        queue = self.guild_queues[ctx.guild]
-        user = ctx.author
+        guild_id = channel.guild.id
         #Alert people of distress
-        await ctx.send(f"<@{user.id}> has sent a distress signal. Something has happened at their island. Attempting to requeue them.")
-        
+        alert = (f"<@{user.id}> has sent a distress signal. Something has happened at their island. "
+                 "Attempting to requeue them.")
+        await self.bot.outbound.run(channel.id, HIGH, lambda: channel.send(alert))
+        title = await self.mutate(guild_id, self.slide, guild_id, user)
+        self.renderer.schedule(guild_id, channel, lambda: self.queue_embed(guild_id, title))
+
+    def slide(self, guild_id, user):
+        """ Put a distressed host back at the front of the queue and get the title describing the outcome. """
+        queue = self.guild_queues[guild_id]
+
         if len(queue.active) == 0:
             #List is empty
-            queue.active.append(user)
-            embed = self.queue_embed(ctx.guild, f'**{user.display_name}** is back in the queue')
-        elif queue.active[0] == user:
+            queue.active.append(user.id)
+            self.journal(guild_id, 'add', u=user.id)
+            title = f'**{user.display_name}** is back in the queue'
+        elif queue.active[0] == user.id:
             #They have not left queue yet
-            embed = self.queue_embed(ctx.guild, f'**{user.display_name}** never left')
+            title = f'**{user.display_name}** never left'
         else:
-            if user in queue.active:
-                queue.active.remove(user)
-            queue.active.insert(1,user)
-            embed = self.queue_embed(ctx.guild, f'**{user.display_name}** is back in the queue')
-            
-        if queue.last_msg:
-            try:
-                await queue.last_msg.delete()
-            except discord.errors.NotFound:
-                pass
+            if user.id in queue.active:
+                queue.active.move(user.id, 1)
+                self.journal(guild_id, 'mv', u=user.id, p=1)
+            else:
+                queue.active.insert(1, user.id)
+                self.journal(guild_id, 'ins', u=user.id, p=1)
+            title = f'**{user.display_name}** is back in the queue'
 
-        queue.last_msg = await ctx.send(embed=embed)
+        return title
     
-    async def clear_user(self, user):
-        queue = self.guild_queues[user.guild]
-        brownies = queue.brownies[user]
-        if brownies <= -4 and user.id != queue.active[0].id:
-            await self.queue_remove(user)
-            queue.brownies.pop(user, None)
-            queue.old_brownies.pop(user, None)
-        elif user in queue.active:
-            await self.warn_user(user, -2 - brownies)
+    async def clear_user(self, guild_id, user_id):
+        queue = self.guild_queues[guild_id]
+        brownies = queue.brownies[user_id]
+        if brownies <= -4 and user_id != queue.active.head:
+            await self.queue_remove(guild_id, user_id)
+        elif user_id in queue.active:
+            await self.warn_user(guild_id, user_id, -2 - brownies)
         else:
-            queue.brownies.pop(user, None)
-            queue.old_brownies.pop(user, None)
+            queue.brownies.pop(user_id, None)
+            queue.old_brownies.pop(user_id, None)
+            self.journal_points(guild_id, user_id)
         return
     
-    async def queue_remove(self, user):
-        queue = self.guild_queues[user.guild]
-        if user in queue.active:
-            queue.active.remove(user)
-            await user.send("We are terribly sorry, but due to inactivity foound by the bot, we have been forced to remove you from the queue. Please contact a mod if this is a mistake.")        
-        queue.brownies.pop(user, None)
-        queue.old_brownies.pop(user, None) 
+    async def queue_remove(self, guild_id, user_id):
+        queue = self.guild_queues[guild_id]
+        if user_id in queue.active:
+            queue.active.remove(user_id)
+            self.journal(guild_id, 'del', u=user_id)
+            self.dms.send(user_id, "We are terribly sorry, but due to inactivity foound by the bot, we have been forced to remove you from the queue. Please contact a mod if this is a mistake.")
+        queue.brownies.pop(user_id, None)
+        queue.old_brownies.pop(user_id, None)
+        self.journal_points(guild_id, user_id)
         return
     
-    async def warn_user(self, user, n):
-        queue = self.guild_queues[user.guild]
-        brownies = queue.brownies[user]
-        if user.id == queue.active[0].id:
-            await user.send("Hi! We noticed it may be taking a while to water your flowers. need any help from the mods?")
-        elif user in queue.active:
-            await user.send(f"Hi! We've noticed that you may be inactive in the queue. If you could, please help out water. Thank you! This counts as warning # {n}.")
+    async def warn_user(self, guild_id, user_id, n):
+        queue = self.guild_queues[guild_id]
+        brownies = queue.brownies[user_id]
+        if user_id == queue.active[0]:
+            self.dms.send(user_id, "Hi! We noticed it may be taking a while to water your flowers. need any help from the mods?")
+        elif user_id in queue.active:
+            self.dms.send(user_id, f"Hi! We've noticed that you may be inactive in the queue. If you could, please help out water. Thank you! This counts as warning # {n}.")
         return
     
-    async def point_swipe(self,queue):     
-        for key in queue.brownies.keys():
-            await self.remove_points(key)
-        print("I have collected the point tax.")
-        return
-        
     def isDodo(self, dodo):
-        print("entered checker")
         dodo = str(dodo) #Cast as String for easier usage
         bad_letters = ['I','O','Z','i','o','z']
         result = len(dodo) == 5
-        print(result)
         for d in dodo:
             result = result and not(d in bad_letters)
         return result and dodo.isalnum()
     
     def add_currs(self,msg,ctx):
-        """Adds Dodo Post to history. Max length is 5"""
-        queue = self.guild_queues[ctx.guild]
-        queue.curr_posts.append(Announcement(msg,ctx))
+        """Adds Dodo Post to history and the reaction index. Max length is 5"""
+        queue = self.guild_queues[ctx.guild.id]
+        announcement = Announcement(msg.id, ctx.channel.id, ctx.author.id)
+        queue.curr_posts.append(announcement)
+        self.announcements.set(msg.id, announcement)
         if len(queue.curr_posts) > 5:
-            queue.curr_posts.remove(queue.curr_posts[0])
+            self.remove_currs(queue, queue.curr_posts[0])
         return
+
+    def remove_currs(self, queue, announcement):
+        """ Remove a Dodo Post from history and the reaction index if it is still in them. """
+        if announcement in queue.curr_posts:
+            queue.curr_posts.remove(announcement)
+
+        self.announcements.pop(announcement.message_id)
     
     # @commands.command(brief='Testing Private DMs')
     # async def message(self, ctx):
@@ -212,353 +509,460 @@ class QueueCog(commands.Cog):
         # await user.send("Imma slide in here for testing.")
         # print("Did I do it?")
     
+    def enqueue(self, guild_id, user):
+        """ Add a member to the queue if there's room and get the title describing the outcome. """
+        queue = self.guild_queues[guild_id]
+
+        if user.id in queue.active:  # Author already in queue
+            return f'**{user.display_name}** is already in the queue'
+        if len(queue.active) >= queue.capacity:  # Queue full
+            return f'Unable to add **{user.display_name}**: Queue is full'
+
+        queue.active.append(user.id)
+        self.journal(guild_id, 'add', u=user.id)
+        self.add_points(guild_id, user.id)
+        return f'**{user.display_name}** has been added to the queue'
+
+    def dequeue(self, guild_id, user_id):
+        """ Remove a user and their points from the queue.
+
+        Returns whether they were in the queue and the new first two users if they were at the front, else None.
+        """
+        queue = self.guild_queues[guild_id]
+
+        if user_id not in queue.active:
+            return False, None
+
+        was_head = queue.active.remove(user_id) == 0
+        queue.brownies.pop(user_id, None)
+        queue.old_brownies.pop(user_id, None)
+        self.journal(guild_id, 'del', u=user_id)
+        self.journal_points(guild_id, user_id)
+        return True, queue.active[:2] if was_head else None
+
+    def arrange(self, guild_id, order):
+        """ Rearrange the queue into the given order of its users with as few moves as it takes.
+
+        Returns the new first two users if the head of the queue changed, else None.
+        """
+        active = self.guild_queues[guild_id].active
+        head = active.head
+
+        for position, user_id in enumerate(order):  # Everyone before position is already in place
+            if active[position] != user_id:
+                active.move(user_id, position)
+                self.journal(guild_id, 'mv', u=user_id, p=position)
+
+        return active[:2] if active.head != head else None
+
+    def shift(self, guild_id, user_ids, offset):
+        """ Move users one place up (offset -1) or down (offset 1) the queue, keeping their order among each other.
+
+        Returns the users that moved, those that weren't queued and the new first two users if the head changed.
+        """
+        active = self.guild_queues[guild_id].active
+        missing = [user_id for user_id in user_ids if user_id not in active]
+        selected = set(user_ids) - set(missing)
+        order = list(active)
+        moved = []
+        places = sorted((active.index(user_id) for user_id in selected), reverse=offset > 0)
+
+        for place in places:  # Users nearest the end they move towards go first so blocks move together
+            target = place + offset
+
+            if 0 <= target < len(order) and order[target] not in selected:  # Not blocked by a user that can't move
+                order[place], order[target] = order[target], order[place]
+                moved.append(order[target])
+
+        return moved, missing, self.arrange(guild_id, order)
+
+    def place(self, guild_id, user_ids, position):
+        """ Move users to consecutive places in the given order starting at a zero-based position.
+
+        Returns the users that weren't queued, the position they start at and the new first two users if the head
+        changed.
+        """
+        active = self.guild_queues[guild_id].active
+        missing = [user_id for user_id in user_ids if user_id not in active]
+        selected = [user_id for user_id in dict.fromkeys(user_ids) if user_id in active]
+        chosen = set(selected)
+        others = [user_id for user_id in active if user_id not in chosen]
+        position = max(0, min(position, len(others)))
+        return missing, position, self.arrange(guild_id, others[:position] + selected + others[position:])
+
+    def dequeue_all(self, guild_id, user_ids):
+        """ Remove users and their points from the queue.
+
+        Returns the users that were removed and the new first two users if the head changed.
+        """
+        active = self.guild_queues[guild_id].active
+        head = active.head
+        removed = [user_id for user_id in dict.fromkeys(user_ids) if self.dequeue(guild_id, user_id)[0]]
+        return removed, active[:2] if active.head != head else None
+
+    def clear_queue(self, guild_id):
+        """ Remove everyone from the queue. """
+        self.guild_queues[guild_id].active.clear()
+        self.journal(guild_id, 'clr')
+
+    def set_capacity(self, guild_id, capacity):
+        self.guild_queues[guild_id].capacity = capacity
+        self.journal(guild_id, 'cap', n=capacity)
+
+    def set_timeout(self, guild_id, timeout):
+        self.guild_queues[guild_id].timeout = timeout
+        self.journal(guild_id, 'tmo', n=timeout)
+        self.watch_head(guild_id, reset=True)
+
+    def restore_points(self, guild_id, user_id):
+        """ Restore a user's points from before their last watering reaction. """
+        queue = self.guild_queues[guild_id]
+
+        if user_id in queue.old_brownies:
+            queue.brownies.restore(user_id, queue.old_brownies[user_id])
+            self.journal_points(guild_id, user_id)
+
     @commands.command(brief='Penalize someone. For testing purposes only')
     @commands.has_permissions(administrator=True)
     async def penalty(self, ctx):
         user = ctx.author
-        await self.remove_points(user)
-        queue = self.guild_queues[user.guild]
-        print(queue.brownies[user])
+        await self.mutate(ctx.guild.id, self.remove_points, ctx.guild.id, user.id)
+        queue = self.guild_queues[ctx.guild.id]
+        log.info('Penalized %s, brownie points now %s', user, queue.brownies.get(user.id))
     
     @commands.command(brief='Join the queue')
     async def join(self, ctx):
         """ Check if the member can be added to the guild queue and add them if so. """
-        queue = self.guild_queues[ctx.guild]
-
-        if ctx.author in queue.active:  # Author already in queue
-            title = f'**{ctx.author.display_name}** is already in the queue'
-        elif len(queue.active) >= queue.capacity:  # Queue full
-            title = f'Unable to add **{ctx.author.display_name}**: Queue is full'
-        else:  # Open spot in queue
-            queue.active.append(ctx.author)
-            title = f'**{ctx.author.display_name}** has been added to the queue'
-            self.add_points(ctx.author)
+        title = await self.mutate(ctx.guild.id, self.enqueue, ctx.guild.id, ctx.author)
 
         # Check and burst queue if full.
-        embed = self.queue_embed(ctx.guild, title)
-
-        if queue.last_msg:
-            try:
-                await queue.last_msg.delete()
-            except discord.errors.NotFound:
-                pass
-
-        queue.last_msg = await ctx.send(embed=embed)
+        self.refresh(ctx, title)
 
 
     @commands.command(brief='Leave the queue')
     async def leave(self, ctx):
         """ Check if the member can be remobed from the guild and remove them if so. """
-        queue = self.guild_queues[ctx.guild]
-        user = ctx.author
-        flag = False    #Flag for checking if author is top of queue
-        if ctx.author == queue.active[0]:
-            flag = True
-        if ctx.author in queue.active:
-            queue.active.remove(ctx.author)
+        removed, head_ids = await self.mutate(ctx.guild.id, self.dequeue, ctx.guild.id, ctx.author.id)
+
+        if removed:
             title = f'**{ctx.author.display_name}** has been removed from the queue '
-            queue.brownies.pop(user, None)
-            queue.old_brownies.pop(user, None)
         else:
             title = f'**{ctx.author.display_name}** isn\'t in the queue '
 
-        embed = self.queue_embed(ctx.guild, title)
-        if queue.last_msg:
-            try:
-                await queue.last_msg.delete()
-            except discord.errors.NotFound:
-                pass
+        self.refresh(ctx, title)
+        if head_ids is not None:  # Author was at the front of the queue
+            await self.announce_head(ctx.channel, head_ids)
 
-        queue.last_msg = await ctx.channel.send(embed=embed)
-        if flag:
-            if len(queue.active) > 0:
-                mention = queue.active[0].id
-                await ctx.send(f"<@{mention}>, you're good to go!")
-            if len(queue.active) > 1:
-                mention = queue.active[1].id
-                await ctx.send(f"<@{mention}>, please be on deck with your Dodo Code!")
-
-    @commands.command(brief='Display who is currently in the queue')
-    async def view(self, ctx):
-        """  Display the queue as an embed list of mentioned names. """
-        queue = self.guild_queues[ctx.guild]
-        embed = self.queue_embed(ctx.guild, 'Players in queue')
-        if queue.last_msg:
-            try:
-                await queue.last_msg.delete()
-            except discord.errors.NotFound:
-                pass
+    @commands.command(usage='view [page | me]', brief='Display who is currently in the queue')
+    async def view(self, ctx, page='1'):
+        """ Display a page of the queue as an embed list of mentioned names, or only the front and your place. """
+        if page.lower() == 'me':
+            await self.reply(ctx, embed=self.position_embed(ctx.guild.id, ctx.author.id))
+            return
 
-        queue.last_msg = await ctx.send(embed=embed)
-        
-    @commands.command(usage='demote <user mention>',
-                      brief='Demote the mentioned user from the queue (must have server kick perms)')
-    @commands.has_permissions(kick_members=True)
-    async def demote(self, ctx):
         try:
-            demotee = ctx.message.mentions[0]
-        except IndexError:
-            embed = discord.Embed(title='Mention a player in the command to demote them', color=self.color)
-            await ctx.send(embed=embed)
+            page = int(page)
+        except ValueError:
+            embed = discord.Embed(title=f'{page} is not a page number', color=self.color)
         else:
-            queue = self.guild_queues[ctx.guild]
-            
-            flag = False    #Flag for checking if removee is top of queue
-                
-            if queue.active != [] and demotee in queue.active:
-                if demotee == queue.active[0]:
-                    flag = True
-                if queue.active[-1] == demotee:
-                    embed = discord.Embed(title='Player is already at bottom of the queue.', color=self.color)
-                    await ctx.send(embed=embed)
-                else:
-                    temp = demotee
-                    place = 0
-                    for i in range(len(queue.active)):
-                        if queue.active[i] == demotee:
-                            place = i
-                            break
-                    queue.active[i] = queue.active[i+1]
-                    queue.active[i+1] = temp
-                    embed = discord.Embed(title='Player moved down the queue.', color=self.color)
-                    await ctx.send(embed=embed)
+            pages = page_count(len(self.guild_queues[ctx.guild.id].active))
+
+            if page == 1:  # The first page is the guild's queue post
+                self.refresh(ctx, 'Players in queue')
+                return
+            elif page < 1 or page > pages:
+                title = f'Page {page} does not exist, the queue has {pages} page{"s" if pages > 1 else ""}'
+                embed = discord.Embed(title=title, color=self.color)
             else:
-                title = f'**{demotee.display_name}** is not in the queue'
-            
-            embed = self.queue_embed(ctx.guild, title)
-            if queue.last_msg:
-                try:
-                    await queue.last_msg.delete()
-                except discord.errors.NotFound:
-                    pass
-
-            queue.last_msg = await ctx.send(embed=embed)
-                 
-            if flag:
-                if len(queue.active) > 0:
-                    mention = queue.active[0].id
-                    await ctx.send(f"<@{mention}>, you're good to go!")
-                if len(queue.active) > 1:
-                    mention = queue.active[1].id
-                    await ctx.send(f"<@{mention}>, please be on deck with your Dodo Code!")
+                embed = self.queue_embed(ctx.guild.id, 'Players in queue', page - 1)
+
+        await self.reply(ctx, embed=embed)
         
-    @commands.command(usage='demote <user mention>',
-                      brief='Demote the mentioned user from the queue (must have server kick perms)')
+    @staticmethod
+    def names(members):
+        """ List the display names of members in bold. """
+        return ', '.join(f'**{member.display_name}**' for member in members)
+
+    async def shift_members(self, ctx, offset):
+        """ Move the mentioned members one place up or down the queue and report it. """
+        direction = 'up' if offset < 0 else 'down'
+        end = 'top' if offset < 0 else 'bottom'
+        members = ctx.message.mentions
+
+        if not members:
+            embed = discord.Embed(title=f'Mention players in the command to move them {direction}', color=self.color)
+            await self.reply(ctx, embed=embed)
+            return
+
+        user_ids = [member.id for member in members]
+        moved, missing, head_ids = await self.mutate(ctx.guild.id, self.shift, ctx.guild.id, user_ids, offset)
+
+        if len(missing) == len(members):
+            title = f'{self.names(members)} {"is" if len(members) == 1 else "are"} not in the queue'
+        else:
+            title = 'Players in queue'
+            player = 'Player' if len(members) == 1 else 'Players'
+
+            if moved:
+                embed = discord.Embed(title=f'{player} moved {direction} the queue.', color=self.color)
+            else:
+                embed = discord.Embed(title=f'{player} already at {end} of the queue.', color=self.color)
+
+            await self.reply(ctx, embed=embed)
+
+        self.refresh(ctx, title)
+
+        if head_ids is not None:  # Someone new is at the front of the queue
+            await self.announce_head(ctx.channel, head_ids)
+
+    @commands.command(usage='demote <user mention> ...',
+                      brief='Demote the mentioned users one place in the queue (must have server kick perms)')
+    @commands.has_permissions(kick_members=True)
+    async def demote(self, ctx):
+        await self.shift_members(ctx, 1)
+
+    @commands.command(usage='promote <user mention> ...',
+                      brief='Promote the mentioned users one place in the queue (must have server kick perms)')
     @commands.has_permissions(kick_members=True)
     async def promote(self, ctx):
-        try:
-            demotee = ctx.message.mentions[0]
-        except IndexError:
-            embed = discord.Embed(title='Mention a player in the command to promote them', color=self.color)
-            await ctx.send(embed=embed)
+        await self.shift_members(ctx, -1)
+
+    @commands.command(usage='move <user mention> <position>',
+                      brief='Move the mentioned user to a position in the queue (must have server kick perms)')
+    @commands.has_permissions(kick_members=True)
+    async def move(self, ctx, member: discord.Member, position: int):
+        """ Move a user straight to a position in the queue. """
+        missing, place, head_ids = await self.mutate(ctx.guild.id, self.place, ctx.guild.id, [member.id], position - 1)
+
+        if missing:
+            title = f'**{member.display_name}** is not in the queue'
         else:
-            queue = self.guild_queues[ctx.guild]
-         
-            if queue.active != [] and demotee in queue.active:
-                if queue.active[0] == demotee:
-                    embed = discord.Embed(title='Player is already at top of the queue.', color=self.color)
-                    await ctx.send(embed=embed)
-                else:
-                    temp = demotee
-                    place = 0
-                    for i in range(len(queue.active)):
-                        if queue.active[i] == demotee:
-                            place = i
-                            break
-                    queue.active[i] = queue.active[i-1]
-                    queue.active[i-1] = temp
-                    embed = discord.Embed(title='Player moved up the queue.', color=self.color)
-                    await ctx.send(embed=embed)
-            else:
-                title = f'**{demotee.display_name}** is not in the queue'
-                    
-            embed = self.queue_embed(ctx.guild, title)
-            if queue.last_msg:
-                try:
-                    await queue.last_msg.delete()
-                except discord.errors.NotFound:
-                    pass
-
-            queue.last_msg = await ctx.send(embed=embed)
-                 
-        
-    @commands.command(usage='remove <user mention>',
-                      brief='Remove the mentioned user from the queue (must have server kick perms)')
+            title = f'**{member.display_name}** has been moved to position {place + 1}'
+
+        self.refresh(ctx, title)
+
+        if head_ids is not None:
+            await self.announce_head(ctx.channel, head_ids)
+
+    @commands.command(usage='reorder <user mention> ...',
+                      brief='Put the mentioned users at the front of the queue in order (must have server kick perms)')
+    @commands.has_permissions(kick_members=True)
+    async def reorder(self, ctx, members: commands.Greedy[discord.Member]):
+        """ Move several users to the front of the queue at once, in the order they are listed. """
+        if not members:
+            embed = discord.Embed(title='Mention players in the order they should be at the front', color=self.color)
+            await self.reply(ctx, embed=embed)
+            return
+
+        user_ids = [member.id for member in members]
+        missing, _, head_ids = await self.mutate(ctx.guild.id, self.place, ctx.guild.id, user_ids, 0)
+
+        if len(missing) == len(user_ids):
+            title = f'{self.names(members)} {"is" if len(members) == 1 else "are"} not in the queue'
+        else:
+            title = 'The queue has been reordered'
+
+        self.refresh(ctx, title)
+
+        if head_ids is not None:
+            await self.announce_head(ctx.channel, head_ids)
+
+    @commands.command(usage='remove <user mention> ...',
+                      brief='Remove the mentioned users from the queue (must have server kick perms)')
     @commands.has_permissions(kick_members=True)
     async def remove(self, ctx):
-        try:
-            removee = ctx.message.mentions[0]
-        except IndexError:
+        members = ctx.message.mentions
+
+        if not members:
             embed = discord.Embed(title='Mention a player in the command to remove them', color=self.color)
-            await ctx.send(embed=embed)
+            await self.reply(ctx, embed=embed)
+            return
+
+        user_ids = [member.id for member in members]
+        removed, head_ids = await self.mutate(ctx.guild.id, self.dequeue_all, ctx.guild.id, user_ids)
+        removees = [member for member in members if member.id in removed]
+
+        if len(removees) == len(members):
+            title = f'{self.names(members)} {"has" if len(members) == 1 else "have"} been removed from the queue'
+        elif removees:
+            title = f'{self.names(removees)} removed from the queue, the others were not in it'
         else:
-            queue = self.guild_queues[ctx.guild]
-            
-            flag = False    #Flag for checking if removee is top of queue
-                
-            if queue.active != [] and removee in queue.active:
-                if removee == queue.active[0]:
-                    flag = True
-                queue.active.remove(removee)
-                title = f'**{removee.display_name}** has been removed from the queue'
-                queue.brownies.pop(removee, None)
-                queue.old_brownies.pop(removee, None)
-            else:
-                title = f'**{removee.display_name}** is not in the queue'
-                
-
-            embed = self.queue_embed(ctx.guild, title)
-
-            if queue.last_msg:
-                try:
-                    await queue.last_msg.delete()
-                except discord.errors.NotFound:
-                    pass
-
-            queue.last_msg = await ctx.send(embed=embed)
-            
-            if flag:
-                if len(queue.active) > 0:
-                    mention = queue.active[0].id
-                    await ctx.send(f"<@{mention}>, you're good to go!")
-                if len(queue.active) > 1:
-                    mention = queue.active[1].id
-                    await ctx.send(f"<@{mention}>, please be on deck with your Dodo Code!")
+            title = f'{self.names(members)} {"is" if len(members) == 1 else "are"} not in the queue'
+
+        self.refresh(ctx, title)
+
+        if head_ids is not None:  # Someone new is at the front of the queue
+            await self.announce_head(ctx.channel, head_ids)
 
     @commands.command(brief='Empty the queue (must have server kick perms)')
     @commands.has_permissions(kick_members=True)
     async def empty(self, ctx):
         """ Reset the guild queue list to empty. """
-        queue = self.guild_queues[ctx.guild]
-        queue.active.clear()
-        embed = self.queue_embed(ctx.guild, 'The queue has been emptied')
-
-        if queue.last_msg:
-            try:
-                await queue.last_msg.delete()
-            except discord.errors.NotFound:
-                pass
-
-        queue.last_msg = await ctx.send(embed=embed)
+        await self.mutate(ctx.guild.id, self.clear_queue, ctx.guild.id)
+        self.refresh(ctx, 'The queue has been emptied')
 
     @remove.error
     @empty.error
     async def remove_error(self, ctx, error):
         """ Respond to a permissions error with an explanation message. """
         if isinstance(error, commands.MissingPermissions):
-            await ctx.trigger_typing()
+            self.bot.outbound.typing(ctx.channel)
             missing_perm = error.missing_perms[0].replace('_', ' ')
             title = f'Cannot remove players without {missing_perm} permission!'
             embed = discord.Embed(title=title, color=self.color)
-            await ctx.send(embed=embed)
+            await self.reply(ctx, embed=embed)
+
+    @demote.error
+    @promote.error
+    @move.error
+    @reorder.error
+    async def move_error(self, ctx, error):
+        """ Respond to a permissions or argument error with an explanation message. """
+        if isinstance(error, commands.MissingPermissions):
+            missing_perm = error.missing_perms[0].replace('_', ' ')
+            title = f'Cannot move players without {missing_perm} permission!'
+        elif isinstance(error, commands.UserInputError):
+            title = f'Usage: `{ctx.prefix}{ctx.command.usage}`'
+        else:
+            return
+
+        self.bot.outbound.typing(ctx.channel)
+        embed = discord.Embed(title=title, color=self.color)
+        await self.reply(ctx, embed=embed)
 
     @commands.command(brief='Set the capacity of the queue (Must have admin perms)')
     @commands.has_permissions(administrator=True)
     async def cap(self, ctx, new_cap):
         """ Set the queue capacity. """
+        suggestion = suggest_argument('cap', new_cap)
+        hint = f' Did you mean `{ctx.prefix}cap {suggestion}`?' if suggestion else ''
+
         try:
             new_cap = int(new_cap)
         except ValueError:
-            embed = discord.Embed(title=f'{new_cap} is not an integer', color=self.color)
+            embed = discord.Embed(title=f'{new_cap} is not an integer.{hint}', color=self.color)
         else:
-            if new_cap < 2 or new_cap > 100:
-                embed = discord.Embed(title='Capacity is outside of valid range', color=self.color)
+            if new_cap < MIN_CAPACITY or new_cap > MAX_CAPACITY:
+                embed = discord.Embed(title=f'Capacity is outside of valid range.{hint}', color=self.color)
             else:
-                self.guild_queues[ctx.guild].capacity = new_cap
+                await self.mutate(ctx.guild.id, self.set_capacity, ctx.guild.id, new_cap)
                 embed = discord.Embed(title=f'Queue capacity set to {new_cap}', color=self.color)
 
-        await ctx.send(embed=embed)
+        await self.reply(ctx, embed=embed)
 
     @cap.error
     async def cap_error(self, ctx, error):
         """ Respond to a permissions error with an explanation message. """
         if isinstance(error, commands.MissingPermissions):
-            await ctx.trigger_typing()
+            self.bot.outbound.typing(ctx.channel)
             missing_perm = error.missing_perms[0].replace('_', ' ')
             title = f'Cannot change queue capacity without {missing_perm} permission!'
             embed = discord.Embed(title=title, color=self.color)
-            await ctx.send(embed=embed)
+            await self.reply(ctx, embed=embed)
+
+    @commands.command(usage='timeout <minutes>',
+                      brief='Set how long the head of the queue can be inactive, 0 to disable (Must have admin perms)')
+    @commands.has_permissions(administrator=True)
+    async def timeout(self, ctx, minutes):
+        """ Set the inactivity timeout for the head of the queue. """
+        try:
+            minutes = int(minutes)
+        except ValueError:
+            embed = discord.Embed(title=f'{minutes} is not an integer', color=self.color)
+        else:
+            if minutes < 0 or minutes > 24 * 60:
+                embed = discord.Embed(title='Timeout is outside of valid range', color=self.color)
+            else:
+                await self.mutate(ctx.guild.id, self.set_timeout, ctx.guild.id, minutes or None)
+                title = f'Queue timeout set to {minutes} minutes' if minutes else 'Queue timeout disabled'
+                embed = discord.Embed(title=title, color=self.color)
+
+        await self.reply(ctx, embed=embed)
+
+    @timeout.error
+    async def timeout_error(self, ctx, error):
+        """ Respond to a permissions error with an explanation message. """
+        if isinstance(error, commands.MissingPermissions):
+            self.bot.outbound.typing(ctx.channel)
+            missing_perm = error.missing_perms[0].replace('_', ' ')
+            title = f'Cannot change queue timeout without {missing_perm} permission!'
+            embed = discord.Embed(title=title, color=self.color)
+            await self.reply(ctx, embed=embed)
     
     @commands.command(brief='Announce your Dodo Code to the world. Must be top of queue to do so.')
     async def dodo(self, ctx, dodo_code=None):
-        queue = self.guild_queues[ctx.guild]
+        queue = self.guild_queues[ctx.guild.id]
         flag = False
         #Goal: Makes an announcement by the Bot that said Islander is next.
         if len(queue.active) == 0: #Checks if queue is empty
             embed = discord.Embed(title='Wuh-oh! It seems like the queue is empty. please hit q!join to join the queue!', color=self.color)
-        elif ctx.author != queue.active[0]: #Checks if person is top of queue.
+        elif ctx.author.id != queue.active[0]: #Checks if person is top of queue.
             embed = discord.Embed(title='Wuh-oh! You are not first in line right now.', color=self.color)
         elif dodo_code == None: #Check if something resenbling a Dodo Code was actually enetered
             embed = discord.Embed(title='Wuh-oh! Please put your Dodo Code after the command', color=self.color)
         elif not self.isDodo(dodo_code):
-            embed = discord.Embed(title='Wuh-oh! It seems you did not enter a Dodo Code', color=self.color)
+            title = 'Wuh-oh! It seems you did not enter a Dodo Code'
+            suggestion = suggest_argument('dodo', dodo_code)
+            if suggestion and self.isDodo(suggestion):
+                title += f'. Did you mean `{ctx.prefix}dodo {suggestion}`?'
+            embed = discord.Embed(title=title, color=self.color)
         else: #Person is legitimate and good
             islandee = ctx.author.display_name
             '''Will need to edit this line later. Need to add watering_can emoji'''
             embed = discord.Embed(title=f' Islander: {islandee} \n Dodo Code: {dodo_code} \n Please react with {watering_can.emoji} to earmark you for going.\n Host, tap the {distress.emoji} if something drastic happens.', color=self.color)
             flag = True
-        msg = await ctx.send(embed=embed)
+        msg = await self.reply(ctx, embed=embed)
         if flag:
             self.add_currs(msg,ctx) #Store Current Dodo Post into history
-            await msg.add_reaction(watering_can.emoji)
-            await msg.add_reaction(distress.emoji)
+            self.bot.outbound.post(msg.channel.id, NORMAL, lambda: msg.add_reaction(watering_can.emoji))
+            self.bot.outbound.post(msg.channel.id, NORMAL, lambda: msg.add_reaction(distress.emoji))
     
     @commands.command(brief='Check brownie status. For testing only.')
     @commands.has_permissions(kick_members=True)
     async def brownie(self, ctx):
-        queue = self.guild_queues[ctx.guild]
-        await ctx.send(queue.brownies)
+        queue = self.guild_queues[ctx.guild.id]
+        await self.reply(ctx, dict(queue.brownies.items()))
     
     @commands.Cog.listener()
-    async def on_reaction_add(self, reaction, user):
-        """ Remove a map from the draft when a user reacts with the corresponding icon. """
-        if user == self.bot.user:
+    async def on_raw_reaction_add(self, payload):
+        """ Give brownie points for watering reactions and requeue hosts that react with a distress signal. """
+        announcement = self.announcements.get(payload.message_id)
+
+        if announcement is None or payload.user_id == self.bot.user.id:  # Not a reaction to a live Dodo post
             return
-            
-        guild = user.guild
-        queue = self.guild_queues[guild]
-        
-        for curr_post in queue.curr_posts:
-            print(curr_post)
-            if curr_post.message is None or reaction.message.id != curr_post.message.id:
-                pass
-            elif str(reaction.emoji) == watering_can.emoji: # Someone clicked water
-                #Give them brownie points or something
-                self.add_points(user)
-                return
-            elif str(reaction.emoji) == distress.emoji:
-                print("I did a thing")
-                #Put distressed person 2nd in line and prompt the people
-                if user == curr_post.host.author:
-                    await self.emergency_slide(curr_post.host)
-                    print(queue.curr_posts)
-                    queue.curr_posts.remove(curr_post)
-                    print(queue.curr_posts)
-                else:
-                    await curr_post.message.remove_reaction(distress.emoji,user)
+
+        guild = self.bot.get_guild(payload.guild_id)
+        queue = await self.get_queue(guild)
+        emoji = str(payload.emoji)
+
+        if emoji == watering_can.emoji:  # Someone clicked water
+            await self.mutate(guild.id, self.add_points, guild.id, payload.user_id)
+        elif emoji == distress.emoji:
+            channel = guild.get_channel(announcement.channel_id)
+
+            if channel is None:  # Deleted along with the post
                 return
-     
+
+            # Put distressed person 2nd in line and prompt the people
+            if payload.user_id == announcement.host_id:
+                if self.announcements.pop(announcement.message_id) is None:  # Already handled or expired
+                    return
+
+                await self.emergency_slide(channel, payload.member)
+                self.remove_currs(queue, announcement)
+            else:
+                message = channel.get_partial_message(announcement.message_id)
+                member = payload.member
+                self.bot.outbound.post(channel.id, NORMAL, lambda: message.remove_reaction(distress.emoji, member))
+
     @commands.Cog.listener()
-    async def on_reaction_remove(self, reaction, user):
-        """ Remove a map from the draft when a user reacts with the corresponding icon. """
-        print("Garnered a reaction")
-        if user == self.bot.user:
+    async def on_raw_reaction_remove(self, payload):
+        """ Take back the brownie points of a removed watering reaction. """
+        announcement = self.announcements.get(payload.message_id)
+
+        if announcement is None or payload.user_id == self.bot.user.id or str(payload.emoji) != watering_can.emoji:
             return
-            
-        guild = user.guild
-        queue = self.guild_queues[guild]
-        
-        for curr_post in queue.curr_posts:
-            print(curr_post)
-            if curr_post.message is None or reaction.message.id != curr_post.message.id:
-                pass
-            elif str(reaction.emoji) == watering_can.emoji: # Someone removed water
-                queue.brownies[user] = queue.old_brownies[user]
-                print("Points = ",queue.brownies[user])
-                return
-        
 
-    @tasks.loop(minutes = 10)
-    async def queue_maintenance(self):
-        for queue in self.guild_queues:
-            await self.point_swipe(self.guild_queues[queue])
\ No newline at end of file
+        guild = self.bot.get_guild(payload.guild_id)
+        await self.get_queue(guild)
+        await self.mutate(guild.id, self.restore_points, guild.id, payload.user_id)
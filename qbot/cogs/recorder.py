@@ -0,0 +1,109 @@
+# recorder.py
+
+import asyncio
+import datetime
+from discord.ext import commands
+import logging
+import os
+import time
+
+from .utils.traffic import TrafficWriter
+
+log = logging.getLogger('qbot.recorder')
+
+FLUSH_INTERVAL = 5  # Seconds between flushes of a quiet recording
+
+
+class RecorderCog(commands.Cog):
+    """ Records the gateway traffic the queue and help cogs react to so it can be replayed against a fake Discord.
+
+    Guild messages, reactions to live Dodo posts and guild joins and removals are recorded with the seconds since
+    recording started. Only the content of commands and mentions of the bot is kept, other messages are recorded
+    without it since they only move queue posts up the channel. Each run writes a new file named after the given path
+    with the start time inserted before the extension. The cog has to be added before the QueueCog so it records a
+    distress reaction before the QueueCog takes the post out of its announcements. See benchmarks/replay.py for
+    playing a recording back.
+    """
+
+    def __init__(self, bot, path):
+        """ Set attributes. """
+        self.bot = bot
+        started_at = time.time()
+        root, ext = os.path.splitext(path)
+        self.path = f'{root}.{datetime.datetime.fromtimestamp(started_at):%Y%m%d-%H%M%S}{ext}'
+        self.writer = TrafficWriter(self.path, started_at)
+        self.start = time.monotonic()
+        self.recorded = 0  # Events recorded so far
+        self.flusher = bot.loop.create_task(self.flush_periodically())
+        log.info('Recording traffic to %s', self.path)
+
+    def record(self, event, **fields):
+        """ Buffer an event, flushing the buffer once it is full. """
+        self.recorded += 1
+
+        if self.writer.add({'t': round(time.monotonic() - self.start, 3), 'e': event, **fields}):
+            self.bot.loop.create_task(self.writer.flush())
+
+    async def flush_periodically(self):
+        """ Flush the recording every few seconds so little is lost if the process dies. """
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.writer.flush()
+
+    def is_command(self, message):
+        """ Indicate whether a message may be a command or a mention of the bot, whose content is worth keeping. """
+        content = message.content.lower()
+        prefixes = self.bot.command_prefix
+        prefixes = (prefixes,) if isinstance(prefixes, str) else prefixes
+
+        if any(content.startswith(prefix.lower()) for prefix in prefixes):
+            return True
+
+        return self.bot.user is not None and str(self.bot.user.id) in content
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """ Record a guild message from a user. """
+        if message.guild is None or message.author.bot:
+            return
+
+        fields = {'g': message.guild.id, 'c': message.channel.id, 'u': message.author.id}
+
+        if self.is_command(message):
+            fields['x'] = message.content
+            fields['m'] = message.raw_mentions
+
+        self.record('msg', **fields)
+
+    def record_reaction(self, event, payload):
+        """ Record a reaction to a live Dodo post along with who posted it. """
+        queue_cog = self.bot.get_cog('QueueCog')
+        announcement = queue_cog.announcements.get(payload.message_id) if queue_cog else None
+
+        if announcement is None:  # The cogs ignore reactions to anything else
+            return
+
+        self.record(event, g=payload.guild_id, c=payload.channel_id, u=payload.user_id, p=payload.message_id,
+                    h=announcement.host_id, x=str(payload.emoji))
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        self.record_reaction('add', payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self.record_reaction('rm', payload)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        self.record('join', g=guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.record('leave', g=guild.id)
+
+    def cog_unload(self):
+        """ Stop flushing periodically and write what is left of the recording. """
+        self.flusher.cancel()
+        self.writer.close()
+        log.info('Recorded %d events to %s', self.recorded, self.path)
@@ -0,0 +1,97 @@
+# decay.py
+
+import time
+
+DECAY_PERIOD = 600  # Seconds it takes to lose a single point
+
+
+def decayed(entry, now, period=DECAY_PERIOD):
+    """ Get the current points of a persisted (points, anchor) entry. """
+    points, anchor = entry
+    return points - int((now - anchor) // period) if now > anchor else points
+
+
+def score(entry, period=DECAY_PERIOD):
+    """ Get a time-independent ranking score of a (points, anchor) entry.
+
+    All balances decay at the same rate, so ordering by points plus elapsed periods at the anchor gives the same order
+    as the current points (up to rounding within a period) without needing to know the current time.
+    """
+    points, anchor = entry
+    return points + anchor / period
+
+
+class DecayingPoints:
+    """ Point balances that lose a point every period, computed lazily from when each balance was last updated.
+
+    Each balance is stored as (points, anchor) where anchor is the wall clock time the points were valid at, so
+    reading or updating a balance only costs work for that one user and balances survive restarts.
+    """
+
+    __slots__ = ('entries', 'period', 'clock')
+
+    def __init__(self, period=DECAY_PERIOD, clock=time.time):
+        """ Set attributes. """
+        self.entries = {}  # Maps key -> (points, anchor)
+        self.period = period
+        self.clock = clock
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, key):
+        return self.entry(key)[0]
+
+    def __repr__(self):
+        return f'DecayingPoints({dict(self.items())!r})'
+
+    def get(self, key, default=None):
+        """ Get the current points of a key or default if it isn't tracked. """
+        return self[key] if key in self.entries else default
+
+    def items(self):
+        """ Iterate over (key, current points) pairs. """
+        for key in self.entries:
+            yield key, self[key]
+
+    def entry(self, key, now=None):
+        """ Get the (points, anchor) of a key with all whole periods that passed folded into the points. """
+        points, anchor = self.entries[key]
+        now = self.clock() if now is None else now
+        ticks = int((now - anchor) // self.period) if now > anchor else 0
+        return points - ticks, anchor + ticks * self.period
+
+    def set(self, key, points):
+        """ Set the points of a key, starting a new decay period now. """
+        self.entries[key] = (points, self.clock())
+
+    def add(self, key, delta):
+        """ Add to the current points of a key without resetting the progress of its decay period. """
+        points, anchor = self.entry(key)
+        self.entries[key] = (points + delta, anchor)
+
+    def restore(self, key, entry):
+        """ Set a key back to a (points, anchor) entry (a bare number is treated as points valid now). """
+        if isinstance(entry, (int, float)):
+            entry = (entry, self.clock())
+
+        self.entries[key] = tuple(entry)
+
+    def pop(self, key, default=None):
+        """ Stop tracking a key and return its last entry. """
+        return self.entries.pop(key, default)
+
+    def next_check(self, key, threshold):
+        """ Get the time at which the points of a key next need checking against a threshold.
+
+        This is when they will first be at or below the threshold, or the next decay if they already are.
+        """
+        points, anchor = self.entry(key)
+        ticks = max(points - threshold, 1)
+        return anchor + ticks * self.period
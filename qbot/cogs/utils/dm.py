@@ -0,0 +1,130 @@
+# dm.py
+
+import asyncio
+import discord
+import logging
+import time
+
+log = logging.getLogger('qbot.dm')
+
+
+class DMDispatcher:
+    """ Delivers direct messages from a bounded pool of workers so senders never wait on or crash from them.
+
+    Identical messages still waiting for a user are only sent once, each user is sent at most one message per
+    route_interval seconds, failed sends are retried with exponential backoff and users with closed DMs are recorded
+    in undeliverable and skipped for forbidden_ttl seconds instead of raising.
+    """
+
+    def __init__(self, resolve, workers=4, route_interval=1.0, max_retries=3, backoff=2.0, forbidden_ttl=3600):
+        """ Set attributes. resolve is a coroutine function getting the user object of a user ID. """
+        self.resolve = resolve
+        self.num_workers = workers
+        self.route_interval = route_interval
+        self.max_retries = max_retries
+        self.backoff = backoff  # Seconds before the first retry, doubled for each one after
+        self.forbidden_ttl = forbidden_ttl
+        self.queue = None
+        self.workers = []
+        self.retries = set()  # Timer handles that will queue retries
+        self.pending = set()  # (user ID, content) pairs queued or being retried
+        self.next_send = {}  # Maps user ID -> monotonic time before which they can't be sent another message
+        self.undeliverable = {}  # Maps user ID -> monotonic time their DMs were found to be closed
+        self.stats = {'queued': 0, 'sent': 0, 'deduplicated': 0, 'retried': 0, 'failed': 0, 'forbidden': 0}
+
+    def start(self):
+        """ Start the worker pool if it isn't running. """
+        if not self.workers:
+            loop = asyncio.get_event_loop()
+            self.queue = asyncio.Queue()
+            self.workers = [loop.create_task(self.work()) for _ in range(self.num_workers)]
+
+    def stop(self):
+        """ Cancel the workers, dropping any undelivered messages. """
+        for worker in self.workers:
+            worker.cancel()
+
+        for handle in self.retries:
+            handle.cancel()
+
+        self.workers = []
+        self.retries.clear()
+        self.pending.clear()
+
+    def send(self, user_id, content):
+        """ Queue a DM to a user and return whether it was queued. """
+        key = (user_id, content)
+        forbidden_at = self.undeliverable.get(user_id)
+
+        if forbidden_at is not None:
+            if time.monotonic() - forbidden_at < self.forbidden_ttl:
+                return False
+
+            del self.undeliverable[user_id]
+
+        if key in self.pending:
+            self.stats['deduplicated'] += 1
+            return False
+
+        self.start()
+        self.pending.add(key)
+        self.queue.put_nowait((user_id, content, 0))
+        self.stats['queued'] += 1
+        return True
+
+    async def work(self):
+        """ Deliver queued messages until cancelled. """
+        while True:
+            user_id, content, attempt = await self.queue.get()
+
+            try:
+                await self.deliver(user_id, content, attempt)
+            except Exception:  # Keep the worker alive and let the message be sent again
+                log.exception('Failed to deliver a DM to user %d', user_id)
+                self.stats['failed'] += 1
+                self.pending.discard((user_id, content))
+            finally:
+                self.queue.task_done()
+
+    def retry(self, handle, message):
+        """ Queue a message again once its retry is due. """
+        self.retries.discard(handle)
+        self.queue.put_nowait(message)
+
+    async def deliver(self, user_id, content, attempt):
+        """ Send a single message, scheduling a retry or recording the user if it fails. """
+        key = (user_id, content)
+        wait = self.next_send.get(user_id, 0) - time.monotonic()
+
+        if wait > 0:  # Respect the spacing of the user's DM route
+            await asyncio.sleep(wait)
+
+        self.next_send[user_id] = time.monotonic() + self.route_interval
+
+        try:
+            user = await self.resolve(user_id)
+            await user.send(content)
+        except discord.errors.Forbidden:
+            self.undeliverable[user_id] = time.monotonic()
+            self.stats['forbidden'] += 1
+        except discord.errors.NotFound:  # User no longer exists
+            self.stats['failed'] += 1
+        except (discord.errors.HTTPException, OSError, asyncio.TimeoutError) as error:
+            if attempt < self.max_retries:
+                delay = self.backoff * 2 ** attempt
+                retry_after = getattr(error, 'response', None) and error.response.headers.get('Retry-After')
+
+                if retry_after:  # Rate limited: wait at least as long as Discord asks
+                    delay = max(delay, float(retry_after))
+
+                self.stats['retried'] += 1
+                message = (user_id, content, attempt + 1)
+                handle = asyncio.get_event_loop().call_later(delay, lambda: self.retry(handle, message))
+                self.retries.add(handle)
+                return
+
+            self.stats['failed'] += 1
+        else:
+            self.stats['sent'] += 1
+
+        self.pending.discard(key)
@@ -0,0 +1,141 @@
+# indexedqueue.py
+
+
+class IndexedQueue:
+    """ Ordered queue of users with constant-time membership and position lookups keyed by user ID.
+
+    Appending and swapping neighbours (promote/demote) are constant time as well. Removing, inserting or moving a user
+    further shifts everyone in between like a list does, and their stored positions are refreshed in the same pass,
+    so those stay linear in the number of users shifted.
+    """
+
+    __slots__ = ('_items', '_positions')
+
+    def __init__(self, items=None):
+        """ Set attributes and add the initial items in order. """
+        self._items = []  # Users in queue order
+        self._positions = {}  # Maps user ID -> index in _items
+
+        for item in items or ():
+            self.append(item)
+
+    @staticmethod
+    def key(item):
+        """ Get the ID a user is indexed by (accepts user objects or raw IDs). """
+        return getattr(item, 'id', item)
+
+    def _reindex(self, start, stop=None):
+        """ Refresh the stored positions of the items in the given slice. """
+        stop = len(self._items) if stop is None else stop
+        items = self._items
+        positions = self._positions
+
+        for i in range(start, stop):
+            positions[getattr(items[i], 'id', items[i])] = i
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __contains__(self, item):
+        return self.key(item) in self._positions
+
+    def __eq__(self, other):
+        if isinstance(other, IndexedQueue):
+            return self._items == other._items
+
+        return self._items == other
+
+    def __repr__(self):
+        return f'IndexedQueue({self._items!r})'
+
+    @property
+    def head(self):
+        """ First user in the queue or None if the queue is empty. """
+        return self._items[0] if self._items else None
+
+    def get(self, item):
+        """ Get the queued user object matching a user or ID or None if it isn't queued. """
+        i = self._positions.get(self.key(item))
+        return None if i is None else self._items[i]
+
+    def index(self, item):
+        """ Get the zero-based position of a user in the queue. """
+        try:
+            return self._positions[self.key(item)]
+        except KeyError:
+            raise ValueError(f'{item!r} is not in the queue') from None
+
+    def append(self, item):
+        """ Add a user to the back of the queue. """
+        key = self.key(item)
+
+        if key in self._positions:
+            raise ValueError(f'{item!r} is already in the queue')
+
+        self._positions[key] = len(self._items)
+        self._items.append(item)
+
+    def insert(self, position, item):
+        """ Add a user at the given position, shifting everyone behind them back one spot. """
+        if item in self:
+            raise ValueError(f'{item!r} is already in the queue')
+
+        position = max(0, min(position, len(self._items)))
+        self._items.insert(position, item)
+        self._reindex(position)
+
+    def remove(self, item):
+        """ Remove a user from the queue and return the position they were at. """
+        try:
+            i = self._positions.pop(getattr(item, 'id', item))
+        except KeyError:
+            raise ValueError(f'{item!r} is not in the queue') from None
+
+        del self._items[i]
+
+        if i < len(self._items):
+            self._reindex(i)
+
+        return i
+
+    def discard(self, item):
+        """ Remove a user if they are queued and return their old position or None. """
+        return self.remove(item) if item in self else None
+
+    def move(self, item, position):
+        """ Move a queued user to the given position (clamped to the queue bounds) and return it. """
+        items = self._items
+        positions = self._positions
+        key = getattr(item, 'id', item)
+        i = positions.get(key)
+
+        if i is None:
+            raise ValueError(f'{item!r} is not in the queue')
+
+        if position == i - 1 or position == i + 1:  # Adjacent swap (promote/demote) only touches two entries
+            if 0 <= position < len(items):
+                other = items[position]
+                items[i], items[position] = other, items[i]
+                positions[getattr(other, 'id', other)] = i
+                positions[key] = position
+                return position
+
+        position = max(0, min(position, len(items) - 1))
+
+        if i != position:
+            item = self._items.pop(i)
+            self._items.insert(position, item)
+            self._reindex(min(i, position), max(i, position) + 1)
+
+        return position
+
+    def clear(self):
+        """ Remove all users from the queue. """
+        self._items.clear()
+        self._positions.clear()
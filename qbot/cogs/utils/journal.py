@@ -0,0 +1,127 @@
+# journal.py
+
+import json
+import os
+
+
+def apply_record(data, record):
+    """ Apply a single journaled queue mutation to guild data in the JSON snapshot format. """
+    guild_data = data.setdefault(str(record['g']), {})
+    queue = guild_data.setdefault('queue', {})
+    active = queue.setdefault('active', [])
+    queue.setdefault('capacity', 10)
+    brownies = queue.setdefault('brownies', {})
+    old_brownies = queue.setdefault('old_brownies', {})
+    op = record['op']
+    user_id = record.get('u')
+
+    if op in ('del', 'mv', 'ins') and user_id in active:
+        active.remove(user_id)
+
+    if op == 'add':
+        if user_id not in active:
+            active.append(user_id)
+    elif op in ('mv', 'ins'):
+        active.insert(record['p'], user_id)
+    elif op == 'clr':
+        active.clear()
+    elif op == 'cap':
+        queue['capacity'] = record['n']
+    elif op == 'tmo':
+        queue['timeout'] = record['n']
+    elif op == 'pts':
+        for points, value in ((brownies, record['v']), (old_brownies, record['o'])):
+            if value is None:
+                points.pop(str(user_id), None)
+            else:
+                points[str(user_id)] = value
+
+
+class Journal:
+    """ Append-only log of queue mutations kept next to the guild data snapshot.
+
+    Records are buffered by add() and appended to the file by write(), which blocks and is meant to be run in an
+    executor with lines taken from the buffer so the event loop never waits on the disk. Records are numbered in the
+    order they are added so a snapshot can drop exactly the ones it captured, marked when its data was collected.
+    """
+
+    def __init__(self, path):
+        """ Set attributes. """
+        self.path = path
+        self.file = None
+        self.buffer = []  # Encoded lines of records not written yet
+        self.written = 0  # Records in the file
+        self.first = 0  # Number of the first record in the file
+        self.next = 0  # Number of the next record to be added
+
+    @property
+    def count(self):
+        """ Records added since the last compaction, including those being written. """
+        return self.next - self.first
+
+    def add(self, records):
+        """ Buffer a batch of compact records to be written. """
+        self.buffer.extend(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        self.next += len(records)
+
+    def mark(self):
+        """ Get the number the next added record will have. """
+        return self.next
+
+    def drop(self, mark):
+        """ Drop the buffered records numbered before a mark. """
+        del self.buffer[:max(mark - (self.next - len(self.buffer)), 0)]
+
+    def take(self):
+        """ Get the buffered lines, emptying the buffer. """
+        lines, self.buffer = self.buffer, []
+        return lines
+
+    def write(self, lines):
+        """ Append lines with a single flush so they survive a crash of the bot process. """
+        if self.file is None:
+            self.file = open(self.path, 'a')
+
+        self.file.write(''.join(lines))
+        self.file.flush()
+        self.written += len(lines)
+
+    def replay(self, data):
+        """ Apply every journaled record to the guild data and return how many were applied. """
+        if not os.path.exists(self.path):
+            return 0
+
+        applied = 0
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # Partially written last line from a crash
+                    break
+
+                apply_record(data, record)
+                applied += 1
+
+        return applied
+
+    def truncate(self, mark=None):
+        """ Drop the written records numbered before a mark, or all of them, once they are captured in a snapshot. """
+        self.close()
+        tail = []
+
+        if mark is not None and mark < self.first + self.written:  # Keep the records added after the mark
+            with open(self.path, 'r') as f:
+                tail = f.readlines()[max(mark - self.first, 0):]
+
+        with open(self.path, 'w') as f:
+            f.write(''.join(tail))
+
+        self.first += self.written - len(tail)
+        self.written = len(tail)
+
+    def close(self):
+        """ Close the journal file if it is open. """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
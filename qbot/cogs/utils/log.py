@@ -0,0 +1,85 @@
+# log.py
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+CONSOLE_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats records as single JSON lines including any structured fields passed in the extra dict. """
+
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        data.update(getattr(record, 'fields', None) or {})
+
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str, separators=(',', ':'))
+
+
+class SamplingFilter(logging.Filter):
+    """ Lets through only a fraction of the records that were logged with a sample rate. """
+
+    def __init__(self, rng=random.random):
+        """ Set attributes. """
+        super().__init__()
+        self.rng = rng
+        self.dropped = 0
+
+    def filter(self, record):
+        rate = getattr(record, 'sample', None)
+
+        if rate is None or self.rng() < rate:
+            return True
+
+        self.dropped += 1
+        return False
+
+
+def log_event(logger, level, msg, sample=None, **fields):
+    """ Log a message with structured fields, optionally only keeping the given fraction of such events. """
+    logger.log(level, msg, extra={'fields': fields, 'sample': sample})
+
+
+def setup_logging(path='qbot.log', level=logging.INFO, max_bytes=10 * 1024 * 1024, backups=5, console=True):
+    """ Route the bot's logging through a queue to a background thread writing rotated JSON lines and the console.
+
+    Logging calls only put the record on a queue, so slow file or terminal writes never block the event loop. Returns
+    the QueueListener so the caller can stop it to flush the queue on shutdown.
+    """
+    handlers = []
+
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(SamplingFilter())  # Drop sampled records before they are queued
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+
+    for name in ('qbot', 'discord'):
+        logger = logging.getLogger(name)
+        logger.addHandler(queue_handler)
+        logger.setLevel(level if name == 'qbot' else max(level, logging.WARNING))
+        logger.propagate = False
+
+    return listener
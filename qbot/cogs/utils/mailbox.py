@@ -0,0 +1,44 @@
+# mailbox.py
+
+import asyncio
+
+
+class Mailbox:
+    """ Runs the operations submitted for each key one at a time in submission order.
+
+    An operation submitted while its key is idle runs straight away in the submitting task. One submitted while an
+    operation of the key is suspended waits on a lock of the key, so operations on one key never interleave while
+    different keys still run concurrently. A key's lock only exists while operations of the key hold or wait on it.
+    An operation must not submit to its own key and wait for the result since it would be waiting on itself.
+    """
+
+    def __init__(self):
+        """ Set attributes. """
+        self.locks = {}  # Maps key -> (lock, number of operations holding or waiting on it)
+        self.stats = {'operations': 0, 'waited': 0}
+
+    async def submit(self, key, operation, *args):
+        """ Call a function or coroutine function with args once the key's earlier operations are done and return its
+        result.
+        """
+        lock, users = self.locks.get(key, (None, 0))
+
+        if lock is None:
+            lock = asyncio.Lock()
+        elif lock.locked():
+            self.stats['waited'] += 1
+
+        self.locks[key] = (lock, users + 1)
+
+        try:
+            async with lock:
+                self.stats['operations'] += 1
+                result = operation(*args)
+                return (await result) if asyncio.iscoroutine(result) else result
+        finally:
+            lock, users = self.locks[key]
+
+            if users == 1:
+                del self.locks[key]
+            else:
+                self.locks[key] = (lock, users - 1)
@@ -0,0 +1,131 @@
+# metrics.py
+
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    """ Format a label set in the Prometheus text format. """
+    if not names:
+        return ''
+
+    values = ('' if value is None else str(value).replace('\\', r'\\').replace('"', r'\"') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+class Metric:
+    """ Base of a named metric with a fixed set of label names. """
+
+    kind = None
+
+    def __init__(self, name, doc, labels=()):
+        """ Set attributes. """
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.values = {}  # Maps label values tuple -> value
+
+    def header(self):
+        return [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        lines = self.header()
+
+        for labels, value in self.values.items():
+            lines.append(f'{self.name}{format_labels(self.label_names, labels)} {value}')
+
+        return lines
+
+
+class Counter(Metric):
+    """ Monotonically increasing count. """
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        """ Mirror a count that is kept elsewhere. """
+        self.values[labels] = value
+
+
+class Gauge(Metric):
+    """ Value that can go up and down. """
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    """ Distribution of observations counted into cumulative buckets. """
+
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        """ Set attributes. """
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        entry = self.values.get(labels)
+
+        if entry is None:  # [per-bucket counts (last is +Inf), sum, count]
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        lines = self.header()
+        bucket_names = self.label_names + ('le',)
+
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels(bucket_names, labels + (bound,))} {cumulative}')
+
+            label_str = format_labels(self.label_names, labels)
+            lines.append(f'{self.name}_sum{label_str} {total}')
+            lines.append(f'{self.name}_count{label_str} {count}')
+
+        return lines
+
+
+class Registry:
+    """ Collection of metrics rendered together in the Prometheus text exposition format. """
+
+    def __init__(self):
+        """ Set attributes. """
+        self.metrics = []
+        self.collectors = []  # Callables run before rendering to refresh gauges
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, doc, labels=()):
+        return self.register(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=()):
+        return self.register(Gauge(name, doc, labels))
+
+    def histogram(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, doc, labels, buckets))
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+
+        lines = []
+
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,157 @@
+# outbound.py
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+
+log = logging.getLogger('qbot.outbound')
+
+# Priority classes, lower runs first
+CRITICAL = 0  # Telling people it's their turn
+HIGH = 1  # Replies to commands and Dodo posts
+NORMAL = 2  # Queue embed refreshes and reactions
+LOW = 3  # Typing indicators
+
+
+class Job:
+    """ A call to Discord waiting in a channel's bucket. """
+
+    __slots__ = ('priority', 'seq', 'call', 'key', 'future', 'context')
+
+    def __init__(self, priority, seq, call, key, future, context):
+        """ Set attributes. """
+        self.priority = priority
+        self.seq = seq
+        self.call = call  # Function returning the awaitable that makes the call
+        self.key = key  # Jobs with the same key supersede each other
+        self.future = future
+        self.context = context  # Context of the submitter so the call is attributed to it
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler:
+    """ Orders all outbound Discord calls by priority so important messages aren't stuck behind cosmetic ones.
+
+    Each channel has its own bucket worked through one call at a time, highest priority first, and at most
+    max_inflight calls run at once across all channels, with free slots going to the highest priority waiting call.
+    A job submitted with a key drops any job with the same key still waiting, and typing indicators are skipped
+    while more than typing_backlog jobs are waiting or the channel already has something to send.
+    """
+
+    def __init__(self, max_inflight=8, typing_backlog=10):
+        """ Set attributes. """
+        self.max_inflight = max_inflight
+        self.typing_backlog = typing_backlog
+        self.seq = itertools.count()
+        self.buckets = {}  # Maps channel ID -> heap of jobs
+        self.workers = {}  # Maps channel ID -> task working through its bucket
+        self.keyed = {}  # Maps key -> latest job submitted with it
+        self.waiting = []  # Heap of (priority, seq, future) of jobs waiting for a slot
+        self.inflight = 0
+        self.backlog = 0  # Jobs waiting in buckets
+        self.stats = {'sent': 0, 'failed': 0, 'superseded': 0, 'typing_suppressed': 0}
+
+    def submit(self, channel_id, priority, call, key=None):
+        """ Queue a call in a channel's bucket and get the future of its result (None if it was superseded). """
+        loop = asyncio.get_event_loop()
+        job = Job(priority, next(self.seq), call, key, loop.create_future(), contextvars.copy_context())
+
+        if key is not None:
+            old = self.keyed.get(key)
+
+            if old and not old.future.done():
+                old.future.set_result(None)
+                self.stats['superseded'] += 1
+
+            self.keyed[key] = job
+
+        heapq.heappush(self.buckets.setdefault(channel_id, []), job)
+        self.backlog += 1
+
+        if channel_id not in self.workers:
+            self.workers[channel_id] = loop.create_task(self.work(channel_id))
+
+        return job.future
+
+    async def run(self, channel_id, priority, call, key=None):
+        """ Make a call through the scheduler and return its result (None if it was superseded). """
+        return await self.submit(channel_id, priority, call, key)
+
+    def post(self, channel_id, priority, call, key=None):
+        """ Make a call through the scheduler without waiting for it, logging it if it fails. """
+        self.submit(channel_id, priority, call, key).add_done_callback(self.log_failure)
+
+    @staticmethod
+    def log_failure(future):
+        if not future.cancelled() and future.exception():
+            log.warning('Outbound call failed: %r', future.exception())
+
+    def typing(self, channel):
+        """ Show the bot typing in a channel unless there is more important traffic waiting. """
+        if self.backlog >= self.typing_backlog or self.buckets.get(channel.id):
+            self.stats['typing_suppressed'] += 1
+            return
+
+        self.post(channel.id, LOW, channel.trigger_typing, key=('typing', channel.id))
+
+    async def acquire(self, priority):
+        """ Wait for a free slot, handing slots out by priority. """
+        if self.inflight < self.max_inflight and not self.waiting:
+            self.inflight += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.seq), future))
+        await future  # The slot is handed over by release
+
+    def release(self):
+        """ Give a slot to the highest priority waiting job or free it. """
+        while self.waiting:
+            _, _, future = heapq.heappop(self.waiting)
+
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.inflight -= 1
+
+    async def work(self, channel_id):
+        """ Make the calls in a channel's bucket in priority order until it is empty. """
+        bucket = self.buckets[channel_id]
+
+        try:
+            while bucket:
+                job = heapq.heappop(bucket)
+                self.backlog -= 1
+
+                if job.key is not None and self.keyed.get(job.key) is job:
+                    del self.keyed[job.key]
+
+                if job.future.done():  # Superseded or cancelled
+                    continue
+
+                await self.acquire(job.priority)
+
+                try:
+                    result = await job.context.run(asyncio.ensure_future, job.call())
+                except Exception as error:
+                    self.stats['failed'] += 1
+
+                    if not job.future.done():
+                        job.future.set_exception(error)
+                else:
+                    self.stats['sent'] += 1
+
+                    if not job.future.done():
+                        job.future.set_result(result)
+                finally:
+                    self.release()
+        finally:
+            del self.workers[channel_id]
+
+            if not bucket:
+                del self.buckets[channel_id]
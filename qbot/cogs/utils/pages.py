@@ -0,0 +1,47 @@
+# pages.py
+
+PAGE_SIZE = 20  # Queue entries shown per page, keeping embed descriptions well under Discord's limit
+
+
+def page_count(length, size=PAGE_SIZE):
+    """ Get the number of pages a list of the given length takes, at least one even when it is empty. """
+    return max(1, -(-length // size))
+
+
+class PagedLines:
+    """ Renders pages of a numbered list of user mentions, caching each position's line until its user changes.
+
+    Only the positions on the requested page are looked at, so a page costs the same however long the list is, and
+    entries that kept their position since the last render are reused instead of being formatted again.
+    """
+
+    __slots__ = ('ids', 'lines')
+
+    def __init__(self):
+        """ Set attributes. """
+        self.ids = []  # User ID each cached line was built for, by position
+        self.lines = []  # Cached line of each position
+
+    def line(self, items, position):
+        """ Get the numbered mention line of the user at a position of items. """
+        user_id = items[position]
+
+        if position >= len(self.ids):
+            missing = position + 1 - len(self.ids)
+            self.ids.extend([None] * missing)
+            self.lines.extend([None] * missing)
+
+        if self.ids[position] != user_id:
+            self.ids[position] = user_id
+            self.lines[position] = f'{position + 1}. <@{user_id}>\n'
+
+        return self.lines[position]
+
+    def page(self, items, page, size=PAGE_SIZE):
+        """ Get the lines of a zero-based page of items joined together. """
+        if len(self.ids) > len(items):  # Drop lines of positions no longer in use
+            del self.ids[len(items):]
+            del self.lines[len(items):]
+
+        start = page * size
+        return ''.join(self.line(items, position) for position in range(start, min(start + size, len(items))))
@@ -0,0 +1,141 @@
+# ranking.py
+
+from bisect import bisect_left, bisect_right, insort
+
+BUCKET_SIZE = 256  # Items per bucket before it is split in two
+
+
+class RankIndex:
+    """ Keys ordered by descending score with rank and top-N lookups.
+
+    Items are kept as (-score, key) in a list of sorted buckets with a Fenwick tree over the bucket lengths, so setting
+    a score, removing a key and looking up a key's rank take O(log n) bisects and tree steps plus a short list shift
+    within one bucket, and the top n are read straight off the front. Ties are ordered by key.
+    """
+
+    __slots__ = ('scores', 'buckets', 'firsts', 'tree')
+
+    def __init__(self):
+        """ Set attributes. """
+        self.scores = {}  # Maps key -> score
+        self.buckets = []  # Sorted lists of (-score, key), each holding items that sort after the previous bucket
+        self.firsts = []  # First item of each bucket, to bisect for the bucket an item belongs in
+        self.tree = [0]  # Fenwick tree of bucket lengths, 1-indexed
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, key):
+        return key in self.scores
+
+    def score(self, key):
+        """ Get the score of a key or None if it isn't indexed. """
+        return self.scores.get(key)
+
+    def _rebuild_tree(self):
+        """ Recompute the Fenwick tree after buckets were added or removed. """
+        tree = [0] + [len(bucket) for bucket in self.buckets]
+
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+
+            if parent < len(tree):
+                tree[parent] += tree[i]
+
+        self.tree = tree
+
+    def _grow(self, index, delta):
+        """ Add to the length of a bucket in the Fenwick tree. """
+        i = index + 1
+
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _before(self, index):
+        """ Count the items in the buckets before a bucket. """
+        count = 0
+        i = index
+
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+
+        return count
+
+    def _locate(self, item):
+        """ Get the index of the bucket an item belongs in. """
+        return max(bisect_right(self.firsts, item) - 1, 0)
+
+    def set(self, key, score):
+        """ Index a key with a score, replacing its old score if it has one. """
+        if key in self.scores:
+            if self.scores[key] == score:
+                return
+
+            self.discard(key)
+
+        self.scores[key] = score
+        item = (-score, key)
+
+        if not self.buckets:
+            self.buckets.append([item])
+            self.firsts.append(item)
+            self._rebuild_tree()
+            return
+
+        index = self._locate(item)
+        bucket = self.buckets[index]
+        insort(bucket, item)
+        self.firsts[index] = bucket[0]
+
+        if len(bucket) > 2 * BUCKET_SIZE:
+            self.buckets[index:index + 1] = [bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]]
+            self.firsts[index:index + 1] = [bucket[0], bucket[BUCKET_SIZE]]
+            self._rebuild_tree()
+        else:
+            self._grow(index, 1)
+
+    def discard(self, key):
+        """ Remove a key from the index if it is in it. """
+        score = self.scores.pop(key, None)
+
+        if score is None:
+            return
+
+        item = (-score, key)
+        index = self._locate(item)
+        bucket = self.buckets[index]
+        del bucket[bisect_left(bucket, item)]
+
+        if bucket:
+            self.firsts[index] = bucket[0]
+            self._grow(index, -1)
+        else:
+            del self.buckets[index]
+            del self.firsts[index]
+            self._rebuild_tree()
+
+    def rank(self, key):
+        """ Get the zero-based rank of a key, 0 being the highest score, or None if it isn't indexed. """
+        score = self.scores.get(key)
+
+        if score is None:
+            return None
+
+        item = (-score, key)
+        index = self._locate(item)
+        return self._before(index) + bisect_left(self.buckets[index], item)
+
+    def top(self, n):
+        """ Get up to n (key, score) pairs with the highest scores, highest first. """
+        top = []
+
+        for bucket in self.buckets:
+            for negated, key in bucket[:n - len(top)]:
+                top.append((key, -negated))
+
+            if len(top) >= n:
+                break
+
+        return top
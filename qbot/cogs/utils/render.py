@@ -0,0 +1,151 @@
+# render.py
+
+import asyncio
+import discord
+import logging
+
+from .outbound import NORMAL
+
+log = logging.getLogger('qbot.render')
+
+
+class RenderedPost:
+    """ A message the scheduler last rendered for a key. """
+
+    __slots__ = ('message_id', 'channel_id', 'signature', 'seen')
+
+    def __init__(self, message_id, channel_id, signature, seen):
+        """ Set attributes. """
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.signature = signature  # Dict form of the embed that was last sent or edited in
+        self.seen = seen  # Channel message count when the message was posted
+
+
+class RenderScheduler:
+    """ Debounces embed refreshes per key and edits the last rendered message in place when possible.
+
+    A refresh waits delay seconds so a burst of commands collapses into one update, renders the embed from the
+    latest state, skips the REST call if nothing changed and only re-posts once the old message has scrolled away.
+    With an outbound scheduler the refresh waits there keyed by its key, so a refresh still waiting behind other
+    traffic is dropped once a newer one for the same key comes in.
+    """
+
+    def __init__(self, delay=1.0, scroll_limit=5, outbound=None):
+        """ Set attributes. """
+        self.delay = delay
+        self.outbound = outbound
+        self.scroll_limit = scroll_limit  # Messages in a channel after which a post is considered scrolled away
+        self.pending = {}  # Maps key -> (channel, render) of the latest requested refresh
+        self.tasks = {}  # Maps key -> task that will flush the pending refresh
+        self.locks = {}  # Maps key -> lock so flushes for a key never overlap
+        self.posts = {}  # Maps key -> RenderedPost
+        self.message_counts = {}  # Maps channel ID -> messages seen in it while it holds a post
+        self.stats = {'requested': 0, 'edited': 0, 'posted': 0, 'unchanged': 0, 'failed': 0}
+
+    def schedule(self, key, channel, render):
+        """ Request a refresh of a key's embed in a channel, rendered later by calling render() or dropped if it
+        returns None.
+        """
+        self.stats['requested'] += 1
+        self.pending[key] = (channel, render)  # Newer requests supersede older ones
+
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.get_event_loop().create_task(self.flush(key))
+
+    def note_message(self, message):
+        """ Count a message sent in a channel to track how far rendered posts have scrolled. """
+        channel_id = message.channel.id
+
+        if channel_id in self.message_counts:
+            self.message_counts[channel_id] += 1
+
+    def forget(self, key):
+        """ Drop all state held for a key. """
+        self.pending.pop(key, None)
+        self.posts.pop(key, None)
+        self.locks.pop(key, None)
+        task = self.tasks.pop(key, None)
+
+        if task:
+            task.cancel()
+
+    def scrolled(self, post, channel):
+        """ Indicate whether a post can no longer be edited in place for a refresh in a channel. """
+        if post.channel_id != channel.id:
+            return True
+
+        return self.message_counts.get(channel.id, 0) - post.seen > self.scroll_limit
+
+    async def flush(self, key):
+        """ Wait out the debounce delay and apply the latest pending refresh. """
+        await asyncio.sleep(self.delay)
+        self.tasks.pop(key, None)  # Refreshes from here on schedule another flush
+
+        if key not in self.pending:  # Forgotten while waiting
+            return
+
+        if self.outbound:
+            channel, _ = self.pending[key]
+            await self.outbound.run(channel.id, NORMAL, lambda: self.apply(key), key=('render', key))
+        else:
+            await self.apply(key)
+
+    async def apply(self, key):
+        """ Render the latest pending refresh of a key and edit or post it. """
+        lock = self.locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            if key not in self.pending:  # Applied by a later flush or forgotten
+                return
+
+            channel, render = self.pending.pop(key)
+            embed = render()
+
+            if embed is None:  # Nothing left to render
+                return
+
+            signature = embed.to_dict()
+            post = self.posts.get(key)
+
+            if post and not self.scrolled(post, channel):
+                if post.signature == signature:
+                    self.stats['unchanged'] += 1
+                    return
+
+                try:
+                    await channel.get_partial_message(post.message_id).edit(embed=embed)
+                except discord.errors.NotFound:
+                    pass
+                except discord.errors.HTTPException as error:
+                    log.warning('Dropped refresh of %s that failed to edit its post: %s', key, error)
+                    self.stats['failed'] += 1
+                    return
+                else:
+                    post.signature = signature
+                    self.stats['edited'] += 1
+                    return
+
+            if post:  # The old post may be in another channel, which is None if it has been deleted
+                old_channel = channel if post.channel_id == channel.id else channel.guild.get_channel(post.channel_id)
+
+                if old_channel:
+                    try:
+                        await old_channel.get_partial_message(post.message_id).delete()
+                    except discord.errors.NotFound:
+                        pass
+                    except discord.errors.HTTPException as error:
+                        log.warning('Dropped refresh of %s that failed to delete its old post: %s', key, error)
+                        self.stats['failed'] += 1
+                        return
+
+            try:
+                message = await channel.send(embed=embed)
+            except discord.errors.HTTPException as error:
+                log.warning('Dropped refresh of %s that failed to post: %s', key, error)
+                self.stats['failed'] += 1
+                return
+
+            self.message_counts.setdefault(channel.id, 0)
+            self.posts[key] = RenderedPost(message.id, channel.id, signature, self.message_counts[channel.id])
+            self.stats['posted'] += 1
@@ -0,0 +1,153 @@
+# startup.py
+
+import asyncio
+import logging
+import time
+
+from .log import log_event
+
+log = logging.getLogger('qbot.startup')
+
+
+class StartupError(Exception):
+    """ Raised when waiting on a startup step whose last run failed or was skipped. """
+
+
+class Step:
+    """ An initialization step registered by a cog. """
+
+    __slots__ = ('name', 'func', 'requires', 'once')
+
+    def __init__(self, name, func, requires, once):
+        """ Set attributes. """
+        self.name = name
+        self.func = func  # Coroutine function doing the work
+        self.requires = tuple(requires)  # Names of the steps that have to finish first
+        self.once = once  # Whether the step only runs on the first ready rather than after every reconnect
+
+
+class Startup:
+    """ Runs the initialization steps cogs register each time the bot becomes ready, in dependency order.
+
+    Every step starts as soon as the steps it requires have finished, so independent steps run concurrently. Steps
+    registered with once=True are skipped after they have succeeded, and others wait on a step with wait(name). A step
+    that fails is logged and the steps depending on it are skipped until a later ready retries them, while waiting on
+    any of them raises a StartupError. The start and duration of each step's last run are kept in timings.
+    """
+
+    def __init__(self):
+        """ Set attributes. """
+        self.steps = {}  # Maps step name -> Step
+        self.done = {}  # Maps step name -> event set once the step has succeeded
+        self.settled = {}  # Maps step name -> event set once the step's current run has succeeded or failed
+        self.errors = {}  # Maps step name -> StartupError of its last run if it failed
+        self.timings = {}  # Maps step name -> (seconds after the run began it started, seconds it took)
+        self.lock = asyncio.Lock()  # Keeps a quick reconnect from running steps while the last run is going
+
+    def register(self, name, func, requires=(), once=True):
+        """ Register a coroutine function to run when the bot is ready after the steps it requires. """
+        if name in self.steps:
+            raise ValueError(f'Startup step {name!r} is already registered')
+
+        self.steps[name] = Step(name, func, requires, once)
+
+    def discard(self, owner):
+        """ Unregister the steps whose functions are methods of an object, such as a cog being removed. """
+        for name in [name for name, step in self.steps.items() if getattr(step.func, '__self__', None) is owner]:
+            del self.steps[name]
+
+    def event(self, name):
+        """ Get the event set once a step has succeeded. """
+        return self.done.setdefault(name, asyncio.Event())
+
+    def attempt(self, name):
+        """ Get the event set once the current run of a step has succeeded or failed. """
+        return self.settled.setdefault(name, asyncio.Event())
+
+    async def wait(self, name):
+        """ Wait until a step has succeeded, raising a StartupError if its last run failed or was skipped. """
+        while not self.event(name).is_set():
+            if name in self.errors:
+                raise self.errors[name]
+
+            await self.attempt(name).wait()
+
+    def settle(self, name, error=None):
+        """ Record the outcome of a step's run and wake what is waiting on it. """
+        if error is None:
+            self.event(name).set()
+        else:
+            self.errors[name] = error
+
+        self.attempt(name).set()
+
+    def check(self):
+        """ Raise a ValueError if a step requires one that isn't registered or steps require each other in a cycle. """
+        state = {}  # Maps step name -> False while its requirements are being visited, True once they all were
+
+        def visit(name, path):
+            if state.get(name) is False:
+                raise ValueError(f'Startup steps require each other: {" -> ".join(path + [name])}')
+            if name not in state:
+                state[name] = False
+
+                for required in self.steps[name].requires:
+                    if required not in self.steps:
+                        raise ValueError(f'Startup step {name!r} requires unregistered step {required!r}')
+
+                    visit(required, path + [name])
+
+                state[name] = True
+
+        for name in self.steps:
+            visit(name, [])
+
+    async def run_step(self, step, tasks, began):
+        """ Run a step once the steps it requires in this run succeeded and return whether it succeeded. """
+        for required in step.requires:
+            if required in tasks and not await tasks[required]:
+                log.warning('Skipping startup step %s since %s failed', step.name, required)
+                self.settle(step.name, StartupError(f'Startup step {step.name!r} skipped since {required!r} failed'))
+                return False
+
+        start = time.perf_counter()
+
+        try:
+            await step.func()
+        except Exception as error:
+            log.exception('Startup step %s failed', step.name)
+            failure = StartupError(f'Startup step {step.name!r} failed: {error!r}')
+            failure.__cause__ = error
+            self.settle(step.name, failure)
+            return False
+        finally:
+            self.timings[step.name] = (start - began, time.perf_counter() - start)
+
+        self.settle(step.name)
+        return True
+
+    async def run(self):
+        """ Run every step that is due and log how long each took. """
+        async with self.lock:
+            self.check()
+            loop = asyncio.get_event_loop()
+            began = time.perf_counter()
+            due = [step for step in self.steps.values() if not (step.once and self.event(step.name).is_set())]
+            tasks = {}
+
+            for step in due:  # Waits on the steps block until this run settles them again
+                self.timings.pop(step.name, None)
+                self.errors.pop(step.name, None)
+
+                if self.attempt(step.name).is_set():
+                    self.settled[step.name] = asyncio.Event()
+
+            for step in due:  # All tasks exist before any runs, so each can find those it requires
+                tasks[step.name] = loop.create_task(self.run_step(step, tasks, began))
+
+            results = await asyncio.gather(*tasks.values())
+            total = time.perf_counter() - began
+            steps = {step.name: round(self.timings[step.name][1] * 1000, 1) for step in due
+                     if step.name in self.timings}
+            log_event(log, logging.INFO, f'Ran {sum(results)} of {len(due)} startup steps in {total * 1000:.1f} ms',
+                      steps_ms=steps, failed=[name for name, ok in zip(tasks, results) if not ok])
@@ -0,0 +1,589 @@
+# storage.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from .decay import decayed, score
+from .journal import Journal, apply_record
+
+log = logging.getLogger('qbot.storage')
+
+HISTORY_RETENTION = 30 * 24 * 3600  # Seconds leaderboard snapshots are kept for
+HISTORY_SLACK = 24 * 3600  # Seconds past the retention a JSON snapshot may be kept so files are rewritten daily at most
+
+
+class Storage:
+    """ Interface for where the CacherCog persists guild data.
+
+    Guild data is passed around in the JSON snapshot format, i.e. a dict mapping guild ID strings to
+    {'queue': {'active': [...], 'capacity': int, 'timeout': int or None, 'brownies': {...}, 'old_brownies': {...}}}
+    where the brownie dicts map user ID strings to [points, anchor] decay entries.
+    """
+
+    async def open(self):
+        """ Prepare the storage for use before any guild data is loaded. """
+
+    async def load_guild(self, guild_id):
+        """ Return the persisted data of a single guild or None if there is none. """
+        raise NotImplementedError
+
+    async def record(self, record):
+        """ Persist a single queue mutation (see journal.apply_record for the format). """
+        raise NotImplementedError
+
+    async def record_batch(self, records):
+        """ Persist a batch of queue mutations in order. """
+        for record in records:
+            await self.record(record)
+
+    def mark(self):
+        """ Get a position in the recorded mutations, taken when the data of a save is collected. """
+        return None
+
+    async def save(self, data, mark=None):
+        """ Persist full guild data for the guilds in data, leaving other guilds as they are.
+
+        Mutations recorded after the mark, which is taken when save is called if not given, may not be reflected in
+        data and are kept.
+        """
+        raise NotImplementedError
+
+    async def top_brownies(self, guild_id, limit=10):
+        """ Return up to limit (user ID, current points) pairs of a guild ordered by most points. """
+        raise NotImplementedError
+
+    async def brownie_entries(self):
+        """ Return (guild ID, user ID, [points, anchor]) of every persisted brownie balance. """
+        raise NotImplementedError
+
+    async def save_snapshot(self, taken_at, rows):
+        """ Persist a leaderboard snapshot of (guild ID or None for all guilds, rank, user ID, points) rows. """
+        raise NotImplementedError
+
+    async def snapshot_history(self, guild_id, user_id, since=0):
+        """ Return the (time taken, rank, points) a user had in the snapshots of a guild (None for all guilds). """
+        raise NotImplementedError
+
+    async def close(self):
+        """ Release any resources held by the storage. """
+
+
+class JsonStorage(Storage):
+    """ Stores all guild data in a single JSON file with an optional mutation journal.
+
+    Each guild's JSON is cached once encoded so a save only re-encodes the guilds it is given. Encoding and file
+    I/O run in an executor and the file is replaced atomically so a crash mid-write never truncates it. Journaled
+    records buffered while a write is in progress go out together in the next one. Leaderboard snapshots are appended
+    to a history file per guild, plus one for the snapshots across guilds, so reading a guild's history only reads its
+    own snapshots. Snapshots older than the retention are dropped when their file is next appended to.
+    """
+
+    def __init__(self, path, journal=False, compact_threshold=1000, history_retention=HISTORY_RETENTION):
+        """ Set attributes. """
+        self.path = path
+        self.journal = Journal(f'{path}.journal') if journal else None
+        self.journal_lock = asyncio.Lock()  # Keeps journal writes and saves from running at the same time
+        self.journal_task = None  # Task writing the buffered journal records
+        self.compact_threshold = compact_threshold  # Journal length after which the caller should save
+        self.data = {}  # Mirror of what is on disk plus journaled changes
+        self.encoded = {}  # Maps guild ID string -> encoded JSON of that guild's data
+        self.stale = set()  # Guild ID strings changed by records since they were last encoded
+        self.history_dir = f'{path}.snapshots'
+        self.history_retention = history_retention
+        self.history_oldest = {}  # Maps history file path -> time the oldest snapshot in it was taken
+
+    @property
+    def needs_compaction(self):
+        """ Indicate whether the journal has grown past the compaction threshold. """
+        return self.journal is not None and self.journal.count >= self.compact_threshold
+
+    def _write(self):
+        """ Assemble the file from the encoded guilds and atomically replace the old one. """
+        tmp_path = f'{self.path}.tmp'
+
+        with open(tmp_path, 'w') as f:
+            f.write('{' + ', '.join(f'"{guild_id}": {enc}' for guild_id, enc in self.encoded.items()) + '}')
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        data = {}
+
+        if os.path.exists(self.path):  # Check for guild data file first
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+
+        replayed = self.journal.replay(data) if self.journal else 0
+        self.encoded = {guild_id: json.dumps(guild_data) for guild_id, guild_data in data.items()}
+
+        if replayed:  # Compact the replayed journal into a fresh snapshot
+            self._write()
+            self.journal.truncate()
+
+        return data, replayed
+
+    def _save(self, data, stale, mark):
+        for guild_id, guild_data in data.items():
+            self.encoded[guild_id] = json.dumps(guild_data)
+
+        self.encoded.update(stale)
+        self._write()
+
+        if self.journal:
+            self.journal.truncate(mark)  # The records before the mark are now in the snapshot
+
+    async def open(self):
+        loop = asyncio.get_event_loop()
+        self.data, replayed = await loop.run_in_executor(None, self._load)
+
+        if replayed:
+            log.info('Replayed %d journaled changes', replayed)
+
+    async def load_guild(self, guild_id):
+        return self.data.get(str(guild_id))
+
+    async def record(self, record):
+        await self.record_batch((record,))
+
+    async def record_batch(self, records):
+        if self.journal is None:  # Without a journal changes are only persisted on save
+            return
+
+        for record in records:
+            apply_record(self.data, record)
+            self.stale.add(str(record['g']))
+
+        self.journal.add(records)
+
+        if self.journal_task is None:
+            self.journal_task = asyncio.get_event_loop().create_task(self.write_journal())
+
+    async def write_journal(self):
+        """ Write the buffered journal records until none are left. """
+        loop = asyncio.get_event_loop()
+
+        try:
+            while self.journal.buffer:
+                async with self.journal_lock:  # Released between writes so a waiting save isn't held off by traffic
+                    lines = self.journal.take()  # Emptied by a save that went first if it covered every record
+
+                    if lines:
+                        await loop.run_in_executor(None, self.journal.write, lines)
+        finally:
+            self.journal_task = None
+
+    def mark(self):
+        return self.journal.mark() if self.journal else None
+
+    async def save(self, data, mark=None):
+        if mark is None:
+            mark = self.mark()
+
+        if self.journal is None:  # Otherwise the records keep the mirror up to date, including those after the mark
+            self.data.update(data)
+
+        # Guilds changed by records but not passed in to save
+        stale = {guild_id: json.dumps(self.data[guild_id]) for guild_id in self.stale.difference(data)}
+        self.stale.clear()
+
+        async with self.journal_lock:  # Keeps journal writes out of the way of the truncation
+            if self.journal:
+                self.journal.drop(mark)  # Buffered records before the mark are in the snapshot as well
+
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._save, data, stale, mark)
+
+    async def top_brownies(self, guild_id, limit=10):
+        brownies = self.data.get(str(guild_id), {}).get('queue', {}).get('brownies', {})
+        ranked = sorted(brownies.items(), key=lambda item: score(item[1]), reverse=True)[:limit]
+        now = time.time()
+        return [(int(user_id), decayed(entry, now)) for user_id, entry in ranked]
+
+    async def brownie_entries(self):
+        return [(int(guild_id), int(user_id), entry) for guild_id, guild_data in self.data.items()
+                for user_id, entry in guild_data.get('queue', {}).get('brownies', {}).items()]
+
+    def history_file(self, guild_id):
+        """ Get the path of the file the snapshots of a guild, or of all guilds if None, are kept in. """
+        return os.path.join(self.history_dir, f'{"global" if guild_id is None else guild_id}.jsonl')
+
+    def _prune_history(self, path, cutoff):
+        """ Rewrite a history file without the snapshots taken before the cutoff. """
+        with open(path, 'r') as f:
+            lines = [line for line in f if json.loads(line)['t'] >= cutoff]
+
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(''.join(lines))
+
+        os.replace(f'{path}.tmp', path)
+        return json.loads(lines[0])['t'] if lines else None
+
+    def _append_snapshots(self, taken_at, guild_rows):
+        os.makedirs(self.history_dir, exist_ok=True)
+        cutoff = taken_at - self.history_retention
+
+        for guild_id, rows in guild_rows.items():
+            path = self.history_file(guild_id)
+
+            if path not in self.history_oldest and os.path.exists(path):
+                with open(path, 'r') as f:
+                    first = f.readline()
+
+                self.history_oldest[path] = json.loads(first)['t'] if first else None
+
+            oldest = self.history_oldest.get(path)
+
+            if oldest is not None and oldest < cutoff - HISTORY_SLACK:
+                oldest = self._prune_history(path, cutoff)
+
+            with open(path, 'a') as f:
+                f.write(json.dumps({'t': taken_at, 'rows': rows}, separators=(',', ':')) + '\n')
+
+            self.history_oldest[path] = taken_at if oldest is None else oldest
+
+    def _read_history(self, guild_id, user_id, since):
+        history = []
+        path = self.history_file(guild_id)
+
+        if not os.path.exists(path):
+            return history
+
+        with open(path, 'r') as f:
+            for line in f:
+                snapshot = json.loads(line)
+
+                if snapshot['t'] >= since:
+                    history.extend((snapshot['t'], rank, points) for rank, row_user_id, points in snapshot['rows']
+                                   if row_user_id == user_id)
+
+        return history
+
+    async def save_snapshot(self, taken_at, rows):
+        guild_rows = {}
+
+        for guild_id, rank, user_id, points in rows:
+            guild_rows.setdefault(guild_id, []).append((rank, user_id, points))
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._append_snapshots, taken_at, guild_rows)
+
+    async def snapshot_history(self, guild_id, user_id, since=0):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._read_history, guild_id, user_id, since)
+
+    async def close(self):
+        if self.journal:
+            if self.journal_task:
+                await self.journal_task
+
+            self.journal.close()
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id INTEGER PRIMARY KEY,
+    capacity INTEGER NOT NULL DEFAULT 10,
+    timeout INTEGER
+);
+CREATE TABLE IF NOT EXISTS queue_entries (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS queue_entries_position ON queue_entries (guild_id, position);
+CREATE TABLE IF NOT EXISTS brownies (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    points INTEGER,
+    updated_at REAL,
+    score REAL,
+    old_points INTEGER,
+    old_updated_at REAL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS brownies_score ON brownies (guild_id, score DESC);
+CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+    taken_at REAL NOT NULL,
+    guild_id INTEGER,
+    rank INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    points INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leaderboard_snapshots_user ON leaderboard_snapshots (guild_id, user_id, taken_at);
+CREATE INDEX IF NOT EXISTS leaderboard_snapshots_taken ON leaderboard_snapshots (taken_at);
+'''
+
+
+class SqliteStorage(Storage):
+    """ Stores guild data as per-guild rows in an SQLite database in WAL mode.
+
+    All database work runs on a single background thread so it never blocks the event loop and
+    writes are applied in the order they were made. Leaderboard snapshots older than the retention are deleted as new
+    ones are saved.
+    """
+
+    def __init__(self, path, history_retention=HISTORY_RETENTION):
+        """ Set attributes. """
+        self.path = path
+        self.history_retention = history_retention
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self.conn = None
+
+    async def _run(self, func, *args):
+        """ Run a function with the database connection on the storage thread. """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._call, func, args)
+
+    def _call(self, func, args):
+        """ Open the connection on first use and run the function inside a transaction. """
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(SCHEMA)
+
+        with self.conn:
+            return func(self.conn, *args)
+
+    @staticmethod
+    def _open(conn):
+        pass  # Connecting and creating the schema is done by _call
+
+    @staticmethod
+    def _load_guild(conn, guild_id):
+        row = conn.execute('SELECT capacity, timeout FROM guilds WHERE guild_id = ?', (guild_id,)).fetchone()
+        rows = conn.execute('SELECT user_id FROM queue_entries WHERE guild_id = ? ORDER BY position', (guild_id,))
+        active = [user_id for user_id, in rows]
+        brownies = {}
+        old_brownies = {}
+
+        rows = conn.execute('SELECT user_id, points, updated_at, old_points, old_updated_at FROM brownies '
+                            'WHERE guild_id = ?', (guild_id,))
+
+        for user_id, points, updated_at, old_points, old_updated_at in rows:
+            if points is not None:
+                brownies[str(user_id)] = [points, updated_at]
+            if old_points is not None:
+                old_brownies[str(user_id)] = [old_points, old_updated_at]
+
+        if row is None and not active and not brownies and not old_brownies:
+            return None
+
+        capacity, timeout = (10, None) if row is None else row
+        return {'queue': {'active': active, 'capacity': capacity, 'timeout': timeout,
+                          'brownies': brownies, 'old_brownies': old_brownies}}
+
+    @staticmethod
+    def _write_active(conn, guild_id, active):
+        """ Replace the queue rows of a guild. """
+        conn.execute('DELETE FROM queue_entries WHERE guild_id = ?', (guild_id,))
+        conn.executemany('INSERT INTO queue_entries VALUES (?, ?, ?)',
+                         ((guild_id, user_id, i) for i, user_id in enumerate(active)))
+
+    @staticmethod
+    def _brownie_row(guild_id, user_id, entry, old_entry):
+        """ Flatten a user's brownie and old brownie decay entries into a brownies row. """
+        points, updated_at = entry if entry else (None, None)
+        old_points, old_updated_at = old_entry if old_entry else (None, None)
+        return (guild_id, user_id, points, updated_at, score(entry) if entry else None, old_points, old_updated_at)
+
+    @classmethod
+    def _record(cls, conn, record):
+        guild_id = record['g']
+        op = record['op']
+        user_id = record.get('u')
+
+        if op == 'add':
+            conn.execute('INSERT OR IGNORE INTO queue_entries VALUES (?, ?, '
+                         '(SELECT COALESCE(MAX(position) + 1, 0) FROM queue_entries WHERE guild_id = ?))',
+                         (guild_id, user_id, guild_id))
+        elif op == 'del':
+            conn.execute('DELETE FROM queue_entries WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+        elif op in ('mv', 'ins'):
+            rows = conn.execute('SELECT user_id FROM queue_entries WHERE guild_id = ? ORDER BY position', (guild_id,))
+            active = [row[0] for row in rows if row[0] != user_id]
+            active.insert(record['p'], user_id)
+            cls._write_active(conn, guild_id, active)
+        elif op == 'clr':
+            conn.execute('DELETE FROM queue_entries WHERE guild_id = ?', (guild_id,))
+        elif op in ('cap', 'tmo'):
+            column = 'capacity' if op == 'cap' else 'timeout'
+            conn.execute(f'INSERT INTO guilds (guild_id, {column}) VALUES (?, ?) '
+                         f'ON CONFLICT (guild_id) DO UPDATE SET {column} = excluded.{column}', (guild_id, record['n']))
+        elif op == 'pts':
+            if record['v'] is None and record['o'] is None:
+                conn.execute('DELETE FROM brownies WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+            else:
+                conn.execute('INSERT OR REPLACE INTO brownies VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             cls._brownie_row(guild_id, user_id, record['v'], record['o']))
+
+    @classmethod
+    def _record_batch(cls, conn, records):
+        for record in records:
+            cls._record(conn, record)
+
+    @classmethod
+    def _save(cls, conn, data):
+        for guild_id, guild_data in data.items():
+            guild_id = int(guild_id)
+            queue = guild_data['queue']
+            conn.execute('INSERT OR REPLACE INTO guilds VALUES (?, ?, ?)',
+                         (guild_id, queue['capacity'], queue.get('timeout')))
+            cls._write_active(conn, guild_id, queue['active'])
+            conn.execute('DELETE FROM brownies WHERE guild_id = ?', (guild_id,))
+            user_ids = set(queue.get('brownies', {})) | set(queue.get('old_brownies', {}))
+            conn.executemany('INSERT INTO brownies VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (cls._brownie_row(guild_id, int(user_id), queue['brownies'].get(user_id),
+                                               queue['old_brownies'].get(user_id)) for user_id in user_ids))
+
+    @staticmethod
+    def _top_brownies(conn, guild_id, limit):
+        rows = conn.execute('SELECT user_id, points, updated_at FROM brownies '
+                            'WHERE guild_id = ? AND points IS NOT NULL ORDER BY score DESC LIMIT ?', (guild_id, limit))
+        now = time.time()
+        return [(user_id, decayed((points, updated_at), now)) for user_id, points, updated_at in rows]
+
+    @staticmethod
+    def _brownie_entries(conn):
+        rows = conn.execute('SELECT guild_id, user_id, points, updated_at FROM brownies WHERE points IS NOT NULL')
+        return [(guild_id, user_id, [points, updated_at]) for guild_id, user_id, points, updated_at in rows]
+
+    @staticmethod
+    def _save_snapshot(conn, taken_at, rows, retention):
+        conn.execute('DELETE FROM leaderboard_snapshots WHERE taken_at < ?', (taken_at - retention,))
+        conn.executemany('INSERT INTO leaderboard_snapshots VALUES (?, ?, ?, ?, ?)',
+                         ((taken_at, guild_id, rank, user_id, points) for guild_id, rank, user_id, points in rows))
+
+    @staticmethod
+    def _snapshot_history(conn, guild_id, user_id, since):
+        rows = conn.execute('SELECT taken_at, rank, points FROM leaderboard_snapshots '
+                            'WHERE guild_id IS ? AND user_id = ? AND taken_at >= ? ORDER BY taken_at',
+                            (guild_id, user_id, since))
+        return rows.fetchall()
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def load_guild(self, guild_id):
+        return await self._run(self._load_guild, guild_id)
+
+    async def record(self, record):
+        await self._run(self._record, record)
+
+    async def record_batch(self, records):
+        await self._run(self._record_batch, records)  # In a single transaction
+
+    async def save(self, data, mark=None):
+        await self._run(self._save, data)
+
+    async def top_brownies(self, guild_id, limit=10):
+        return await self._run(self._top_brownies, guild_id, limit)
+
+    async def brownie_entries(self):
+        return await self._run(self._brownie_entries)
+
+    async def save_snapshot(self, taken_at, rows):
+        await self._run(self._save_snapshot, taken_at, rows, self.history_retention)
+
+    async def snapshot_history(self, guild_id, user_id, since=0):
+        return await self._run(self._snapshot_history, guild_id, user_id, since)
+
+    async def close(self):
+        if self.conn is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self.executor, self.conn.close)
+            self.conn = None
+
+        self.executor.shutdown(wait=False)
+
+
+def shard_of(guild_id, shard_count):
+    """ Return the ID of the shard that receives a guild's events. """
+    return (int(guild_id) >> 22) % shard_count
+
+
+class ShardedStorage(Storage):
+    """ Routes each guild's data to a separate storage per shard so processes running different shards never share
+    files or database rows.
+
+    Guilds are assigned to shards the same way Discord assigns them, so the shard count has to stay the same between
+    runs for guild data to be found again. Leaderboard snapshots across guilds only cover this process's shards and
+    are kept in the storage of its first shard.
+    """
+
+    def __init__(self, shard_ids, shard_count, factory):
+        """ Set attributes. factory is called with each shard ID to create that shard's storage. """
+        self.shard_count = shard_count
+        self.storages = {shard_id: factory(shard_id) for shard_id in shard_ids}
+
+    def storage(self, guild_id):
+        """ Get the storage of the shard a guild belongs to. """
+        return self.storages[shard_of(guild_id, self.shard_count)]
+
+    @property
+    def needs_compaction(self):
+        return any(getattr(storage, 'needs_compaction', False) for storage in self.storages.values())
+
+    async def open(self):
+        await asyncio.gather(*(storage.open() for storage in self.storages.values()))
+
+    async def load_guild(self, guild_id):
+        return await self.storage(guild_id).load_guild(guild_id)
+
+    async def record(self, record):
+        await self.storage(record['g']).record(record)
+
+    async def record_batch(self, records):
+        shard_records = {}
+
+        for record in records:
+            shard_records.setdefault(shard_of(record['g'], self.shard_count), []).append(record)
+
+        await asyncio.gather(*(self.storages[shard_id].record_batch(part) for shard_id, part in shard_records.items()))
+
+    def mark(self):
+        return {shard_id: storage.mark() for shard_id, storage in self.storages.items()}
+
+    async def save(self, data, mark=None):
+        marks = mark or self.mark()  # Taken before the shards' saves start a loop iteration later
+        shard_data = {shard_id: {} for shard_id in self.storages}
+
+        for guild_id, guild_data in data.items():
+            shard_data[shard_of(guild_id, self.shard_count)][guild_id] = guild_data
+
+        await asyncio.gather(*(self.storages[shard_id].save(part, marks[shard_id])
+                               for shard_id, part in shard_data.items()
+                               if part or getattr(self.storages[shard_id], 'needs_compaction', False)))
+
+    async def top_brownies(self, guild_id, limit=10):
+        return await self.storage(guild_id).top_brownies(guild_id, limit)
+
+    async def brownie_entries(self):
+        parts = await asyncio.gather(*(storage.brownie_entries() for storage in self.storages.values()))
+        return [entry for part in parts for entry in part]
+
+    def history_storage(self, guild_id):
+        """ Get the storage the snapshots of a guild, or of all guilds if None, are kept in. """
+        return self.storages[min(self.storages)] if guild_id is None else self.storage(guild_id)
+
+    async def save_snapshot(self, taken_at, rows):
+        shard_rows = {}
+
+        for row in rows:
+            shard_rows.setdefault(self.history_storage(row[0]), []).append(row)
+
+        await asyncio.gather(*(storage.save_snapshot(taken_at, part) for storage, part in shard_rows.items()))
+
+    async def snapshot_history(self, guild_id, user_id, since=0):
+        return await self.history_storage(guild_id).snapshot_history(guild_id, user_id, since)
+
+    async def close(self):
+        await asyncio.gather(*(storage.close() for storage in self.storages.values()))
@@ -0,0 +1,144 @@
+# suggest.py
+
+from collections import OrderedDict
+import re
+
+import Levenshtein as lev
+
+DODO_LOOKALIKES = str.maketrans({'I': '1', 'O': '0', 'Z': '2'})  # Characters Dodo Codes never contain
+MIN_CAPACITY = 2
+MAX_CAPACITY = 100
+
+
+class BKTree:
+    """ Burkhard-Keller tree for finding words within an edit distance without comparing against every word. """
+
+    def __init__(self):
+        """ Set attributes. """
+        self.root = None  # [word, value, {distance: child node}]
+        self.size = 0
+
+    def add(self, word, value):
+        """ Add a word and the value to return when it matches. """
+        self.size += 1
+
+        if self.root is None:
+            self.root = [word, value, {}]
+            return
+
+        node = self.root
+
+        while True:
+            dist = lev.distance(word, node[0])
+
+            if dist == 0:  # Already present
+                self.size -= 1
+                return
+
+            child = node[2].get(dist)
+
+            if child is None:
+                node[2][dist] = [word, value, {}]
+                return
+
+            node = child
+
+    def search(self, word, max_distance):
+        """ Return (distance, word, value) for every word within max_distance of the given word. """
+        matches = []
+        stack = [self.root] if self.root else []
+
+        while stack:
+            node_word, value, children = stack.pop()
+            dist = lev.distance(word, node_word)
+
+            if dist <= max_distance:
+                matches.append((dist, node_word, value))
+
+            for child_dist, child in children.items():  # Triangle inequality prunes the rest
+                if dist - max_distance <= child_dist <= dist + max_distance:
+                    stack.append(child)
+
+        return matches
+
+
+class CommandSuggester:
+    """ Suggests commands for mistyped input from a BK-tree over command names and aliases.
+
+    The tree is rebuilt only when the bot's commands_version changes and recent lookups are kept in an LRU cache.
+    """
+
+    def __init__(self, bot, threshold=0.5, top_k=3, cache_size=256):
+        """ Set attributes. """
+        self.bot = bot
+        self.threshold = threshold  # Max edit distance relative to the longer of the two words
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # Maps typed word -> suggested commands
+        self.tree = None
+        self.version = None
+        self.longest = 0
+
+    def refresh(self):
+        """ Rebuild the index if the bot's commands changed since it was built. """
+        version = getattr(self.bot, 'commands_version', None)
+
+        if self.tree is not None and version is not None and version == self.version:
+            return
+
+        self.tree = BKTree()
+        self.longest = 0
+
+        for command in self.bot.commands:
+            for name in (command.name, *command.aliases):
+                self.tree.add(name, command)
+                self.longest = max(self.longest, len(name))
+
+        self.version = version
+        self.cache.clear()
+
+    def suggest(self, word):
+        """ Get up to top_k commands closest to a typed word, best first. """
+        self.refresh()
+        word = word.lower()
+        suggestions = self.cache.get(word)
+
+        if suggestions is not None:
+            self.cache.move_to_end(word)
+            return suggestions
+
+        max_distance = int(self.threshold * max(len(word), self.longest))
+        suggestions = []
+
+        for dist, name, command in sorted(self.tree.search(word, max_distance), key=lambda match: match[0]):
+            if dist / max(len(word), len(name)) <= self.threshold and command not in suggestions:
+                suggestions.append(command)
+
+        suggestions = suggestions[:self.top_k]
+        self.cache[word] = suggestions
+
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return suggestions
+
+
+def suggest_argument(command, argument):
+    """ Suggest a corrected argument for commands with constrained arguments or None if there is no fix. """
+    if argument is None:
+        return None
+
+    if command == 'dodo':
+        code = re.sub(r'[\s\-]', '', str(argument)).upper().translate(DODO_LOOKALIKES)
+        return code if len(code) == 5 and code.isalnum() and code != argument else None
+
+    if command == 'cap':
+        digits = re.search(r'\d+', str(argument))
+
+        if digits is None:
+            return None
+
+        fixed = str(min(max(int(digits.group()), MIN_CAPACITY), MAX_CAPACITY))
+        return fixed if fixed != argument else None
+
+    return None
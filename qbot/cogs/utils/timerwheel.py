@@ -0,0 +1,137 @@
+# timerwheel.py
+
+import asyncio
+import time
+
+
+class Timer:
+    """ A callback scheduled on a TimerWheel. """
+
+    __slots__ = ('deadline', 'callback', 'args', 'slot', 'wheel')
+
+    def __init__(self, wheel, deadline, callback, args):
+        """ Set attributes. """
+        self.wheel = wheel
+        self.deadline = deadline  # Clock time the callback is due at
+        self.callback = callback
+        self.args = args
+        self.slot = None  # Set of timers this timer is currently stored in
+
+    @property
+    def cancelled(self):
+        """ Indicate whether the timer was cancelled or has already fired. """
+        return self.slot is None
+
+    def cancel(self):
+        """ Unschedule the timer (no-op if it already fired or was cancelled). """
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+            self.wheel.count -= 1
+
+
+class TimerWheel:
+    """ Hierarchical timing wheel with constant-time timer insertion and cancellation.
+
+    Level 0 has one slot per tick of resolution seconds and each level above has slots spanning a full rotation of the
+    level below. Timers sit in the coarsest level that can hold them and cascade down as their time comes closer, so
+    advancing the wheel only touches timers that are close to firing. A single task drives the wheel, firing callbacks
+    on the event loop in deadline order to within one tick.
+    """
+
+    def __init__(self, resolution=1.0, slots=64, levels=4, clock=time.time):
+        """ Set attributes. """
+        self.resolution = resolution
+        self.num_slots = slots
+        self.clock = clock
+        self.origin = clock()
+        self.tick = 0  # Last tick that was processed
+        self.wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.count = 0  # Number of pending timers
+        self.task = None
+
+    def __len__(self):
+        return self.count
+
+    def _tick_of(self, deadline):
+        """ Get the tick at which a deadline is due. """
+        return int(-(-(deadline - self.origin) // self.resolution))  # Round up so timers never fire early
+
+    def _place(self, timer, cascading=False):
+        """ Store a timer in the slot that will next need to look at it. """
+        # While cascading the current tick's level 0 slot hasn't fired yet so timers can still land in it
+        due = max(self._tick_of(timer.deadline), self.tick if cascading else self.tick + 1)
+        delta = due - self.tick
+        span = self.num_slots
+
+        for level, wheel in enumerate(self.wheels):
+            if delta < span or level == len(self.wheels) - 1:
+                if delta >= span:  # Beyond the top level: park it one rotation out and re-place on cascade
+                    due = self.tick + span - 1
+
+                slot = wheel[(due // (span // self.num_slots)) % self.num_slots]
+                slot.add(timer)
+                timer.slot = slot
+                return
+
+            span *= self.num_slots
+
+    def schedule(self, deadline, callback, *args):
+        """ Call callback(*args) at the given clock time and return the Timer. """
+        timer = Timer(self, deadline, callback, args)
+        self._place(timer)
+        self.count += 1
+        self.start()
+        return timer
+
+    def schedule_in(self, delay, callback, *args):
+        """ Call callback(*args) after delay seconds and return the Timer. """
+        return self.schedule(self.clock() + delay, callback, *args)
+
+    def advance(self, now=None):
+        """ Process every tick up to the given clock time, firing timers that are due. """
+        target = int((self.clock() if now is None else now) - self.origin) // self.resolution
+
+        while self.tick < target:
+            self.tick += 1
+            span = self.num_slots
+
+            for wheel in self.wheels[1:]:  # Cascade coarser levels whose slot boundary was reached
+                if self.tick % span:
+                    break
+
+                slot = wheel[(self.tick // span) % self.num_slots]
+                timers = list(slot)
+                slot.clear()
+
+                for timer in timers:
+                    self._place(timer, cascading=True)
+
+                span *= self.num_slots
+
+            slot = self.wheels[0][self.tick % self.num_slots]
+            timers = list(slot)
+            slot.clear()
+
+            for timer in timers:
+                timer.slot = None
+                self.count -= 1
+                timer.callback(*timer.args)
+
+    async def run(self):
+        """ Drive the wheel once per tick until cancelled. """
+        while True:
+            next_tick = self.origin + (self.tick + 1) * self.resolution
+            await asyncio.sleep(max(next_tick - self.clock(), 0))
+            self.advance()
+
+    def start(self):
+        """ Start driving the wheel if it isn't already. """
+        if self.task is None:
+            self.task = asyncio.get_event_loop().create_task(self.run())
+
+    def stop(self):
+        """ Stop driving the wheel, leaving pending timers in place. """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
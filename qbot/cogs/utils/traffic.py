@@ -0,0 +1,58 @@
+# traffic.py
+
+import asyncio
+import gzip
+import json
+
+FORMAT_VERSION = 1
+
+
+class TrafficWriter:
+    """ Appends recorded events to a gzipped JSON lines file in batches written off the event loop.
+
+    The first line of a recording is a header with the format version and the wall clock time it started. Each
+    following line is one event with its seconds since the start in 't'. Every flush appends a separate gzip member,
+    which gzip readers treat as one continuous stream, so a recording cut short by a crash is still readable.
+    """
+
+    def __init__(self, path, started_at, flush_size=500):
+        """ Set attributes. """
+        self.path = path
+        self.flush_size = flush_size  # Buffered events that trigger a flush
+        self.buffer = [json.dumps({'v': FORMAT_VERSION, 'start': started_at})]
+        self.lock = asyncio.Lock()  # Keeps flushes in order
+
+    def add(self, event):
+        """ Buffer an event, returning True once enough are buffered that it should be flushed. """
+        self.buffer.append(json.dumps(event, separators=(',', ':')))
+        return len(self.buffer) >= self.flush_size
+
+    def _append(self, lines):
+        with gzip.open(self.path, 'at') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    async def flush(self):
+        """ Write the buffered events. """
+        async with self.lock:
+            lines, self.buffer = self.buffer, []
+
+            if lines:
+                await asyncio.get_event_loop().run_in_executor(None, self._append, lines)
+
+    def close(self):
+        """ Write whatever is still buffered, blocking until it is done. """
+        lines, self.buffer = self.buffer, []
+
+        if lines:
+            self._append(lines)
+
+
+def read_traffic(path):
+    """ Read a recording and return its header and list of events in order. """
+    with gzip.open(path, 'rt') as f:
+        header = json.loads(f.readline())
+
+        if header.get('v') != FORMAT_VERSION:
+            raise ValueError(f'Unsupported traffic recording version {header.get("v")!r}')
+
+        return header, [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,66 @@
+# ttlcache.py
+
+from collections import OrderedDict
+import time
+
+
+class TTLCache:
+    """ Mapping with a maximum size whose entries expire a fixed time after they were last set.
+
+    Entries are kept in the order they were set, so the oldest (and first to expire) are always at the front and both
+    size and age eviction are amortized constant time.
+    """
+
+    __slots__ = ('maxsize', 'ttl', 'clock', 'entries')
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        """ Set attributes. """
+        self.maxsize = maxsize
+        self.ttl = ttl  # Seconds an entry lives for
+        self.clock = clock
+        self.entries = OrderedDict()  # Maps key -> (expiry time, value)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def expire(self):
+        """ Drop entries whose time is up. """
+        now = self.clock()
+
+        while self.entries:
+            key, (expires, _) = next(iter(self.entries.items()))
+
+            if expires > now:
+                break
+
+            del self.entries[key]
+
+    def get(self, key, default=None):
+        """ Get the value of a live entry or default. """
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return default
+
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            return default
+
+        return entry[1]
+
+    def set(self, key, value):
+        """ Set an entry, evicting the oldest ones if the cache is full. """
+        self.entries.pop(key, None)
+        self.entries[key] = (self.clock() + self.ttl, value)
+        self.expire()
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """ Remove an entry and return its value or default. """
+        entry = self.entries.pop(key, None)
+        return default if entry is None else entry[1]
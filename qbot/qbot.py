@@ -1,21 +1,168 @@
 # qbot.py
 
+import asyncio
+import discord
 from discord.ext import commands
+import os
 import cogs
+from cogs.utils.log import setup_logging
+from cogs.utils.outbound import OutboundScheduler
+from cogs.utils.startup import Startup
+from cogs.utils.storage import JsonStorage, ShardedStorage, SqliteStorage
+from supervisor import Supervisor
 
 BOT_COLOR = 0x0DA0B7
 DATA_PATH = 'guild_data.json'
+SQLITE_PATH = 'guild_data.sqlite3'
+LOG_PATH = 'qbot.log'
 
 
-def run(discord_token, generic=False):
-    """ Create the bot, add the cogs and run it. """
-    bot = commands.Bot(command_prefix=('q!', 'Q!'), case_insensitive=True)
-    bot.add_cog(cogs.CacherCog(bot, DATA_PATH))
+class QBot(commands.Bot):
+    """ Bot that counts changes to its cogs and commands so cached views of them can be invalidated.
+
+    All messages, reactions and typing indicators the cogs send go through its outbound scheduler, and the cogs
+    initialize themselves as steps of its startup coordinator each time it becomes ready.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """ Set attributes. """
+        self.commands_version = 0  # Set before super().__init__() since it adds the default help command
+        self.outbound = OutboundScheduler()
+        self.startup = Startup()
+        super().__init__(*args, **kwargs)
+
+    async def on_ready(self):
+        """ Run the startup steps the cogs registered. """
+        await self.startup.run()
+
+    def add_cog(self, cog):
+        super().add_cog(cog)
+        self.commands_version += 1
+
+    def remove_cog(self, name):
+        cog = self.get_cog(name)
+
+        if cog is not None:
+            self.startup.discard(cog)
+
+        super().remove_cog(name)
+        self.commands_version += 1
+
+    def add_command(self, command):
+        super().add_command(command)
+        self.commands_version += 1
+
+    def remove_command(self, name):
+        command = super().remove_command(name)
+        self.commands_version += 1
+        return command
+
+
+class ShardedQBot(QBot, commands.AutoShardedBot):
+    """ QBot that runs a subset of the bot's shards in one process. """
+
+
+def shard_path(path, suffix):
+    """ Insert a shard suffix before a path's extension. """
+    root, ext = os.path.splitext(path)
+    return f'{root}.{suffix}{ext}'
+
+
+def create_storage(sqlite, shard_id=None):
+    """ Create the storage guild data is persisted to, separate per shard if a shard ID is given. """
+    path = SQLITE_PATH if sqlite else DATA_PATH
+
+    if shard_id is not None:
+        path = shard_path(path, f'shard{shard_id}')
+
+    return SqliteStorage(path) if sqlite else JsonStorage(path, journal=True)
+
+
+def create_bot(bot_class, storage, generic=False, metrics_port=None, record_path=None, **kwargs):
+    """ Create the bot and add the cogs, recording its traffic if a record path is given. """
+    bot = bot_class(command_prefix=('q!', 'Q!'), case_insensitive=True, **kwargs)
+
+    if record_path is not None:  # Added first so its listeners see events before the other cogs change their state
+        bot.add_cog(cogs.RecorderCog(bot, record_path))
+
+    bot.add_cog(cogs.CacherCog(bot, storage))
     bot.add_cog(cogs.ConsoleCog(bot))
     bot.add_cog(cogs.HelpCog(bot, BOT_COLOR))
+    bot.add_cog(cogs.LeaderboardCog(bot, BOT_COLOR))
     bot.add_cog(cogs.QueueCog(bot, BOT_COLOR))
 
+    if metrics_port is not None:  # Serve metrics on localhost only
+        bot.add_cog(cogs.MetricsCog(bot, port=metrics_port))
+
     if not generic:
         bot.remove_command('cap')
 
-    bot.run(discord_token)
+    return bot
+
+
+def run(discord_token, generic=False, sqlite=False, log_path=LOG_PATH, metrics_port=None, record_path=None):
+    """ Create the bot, add the cogs and run it. """
+    log_listener = setup_logging(log_path)
+    bot = create_bot(QBot, create_storage(sqlite), generic, metrics_port, record_path)
+
+    try:
+        bot.run(discord_token)
+    finally:
+        log_listener.stop()  # Flush queued log records
+
+
+def run_shards(discord_token, shard_ids, shard_count, generic=False, sqlite=False, log_path=LOG_PATH,
+               metrics_port=None, record_path=None):
+    """ Run a range of the bot's shards in this process, persisting each shard's guilds separately. """
+    log_listener = setup_logging(shard_path(log_path, f'shards{shard_ids[0]}-{shard_ids[-1]}'))
+    storage = ShardedStorage(shard_ids, shard_count, lambda shard_id: create_storage(sqlite, shard_id))
+    if record_path is not None:
+        record_path = shard_path(record_path, f'shards{shard_ids[0]}-{shard_ids[-1]}')
+
+    bot = create_bot(ShardedQBot, storage, generic, metrics_port, record_path, shard_ids=shard_ids,
+                     shard_count=shard_count)
+
+    try:
+        bot.run(discord_token)
+    finally:
+        log_listener.stop()
+
+
+async def fetch_shard_count(discord_token):
+    """ Get the number of shards Discord recommends for the bot. """
+    http = discord.http.HTTPClient()
+
+    try:
+        await http.static_login(discord_token, bot=True)
+        shard_count, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+
+    return shard_count
+
+
+def run_sharded(discord_token, processes=2, shard_count=None, generic=False, sqlite=False, log_path=LOG_PATH,
+                metrics_port=None, record_path=None):
+    """ Split the bot's shards into contiguous ranges, run each range in its own process and restart crashed ones.
+
+    Guild data is stored per shard, so shard_count must stay the same between runs. The script calling this must guard
+    it with if __name__ == '__main__' since shard processes are spawned and re-import it.
+    """
+    log_listener = setup_logging(shard_path(log_path, 'supervisor'))
+
+    if shard_count is None:
+        shard_count = asyncio.get_event_loop().run_until_complete(fetch_shard_count(discord_token))
+
+    processes = min(processes, shard_count)
+    workers = {}
+
+    for i in range(processes):
+        shard_ids = list(range(i * shard_count // processes, (i + 1) * shard_count // processes))
+        kwargs = {'generic': generic, 'sqlite': sqlite, 'log_path': log_path,
+                  'metrics_port': None if metrics_port is None else metrics_port + i, 'record_path': record_path}
+        workers[f'shards {shard_ids[0]}-{shard_ids[-1]}'] = ((discord_token, shard_ids, shard_count), kwargs)
+
+    try:
+        Supervisor(run_shards, workers).run()
+    finally:
+        log_listener.stop()
@@ -0,0 +1,86 @@
+# supervisor.py
+
+import logging
+import multiprocessing
+import signal
+import time
+
+log = logging.getLogger('qbot.supervisor')
+
+
+class Supervisor:
+    """ Runs each worker in its own process and restarts the ones that crash.
+
+    A worker that exits cleanly is left stopped. One that crashes is restarted after a backoff that doubles with each
+    consecutive crash up to max_backoff seconds and resets once it has stayed up for stable_after seconds. Processes
+    are spawned rather than forked so they don't inherit the supervisor's threads.
+    """
+
+    def __init__(self, target, workers, max_backoff=60.0, stable_after=300.0, poll_interval=1.0):
+        """ Set attributes. workers maps a name to the (args, kwargs) its process calls target with. """
+        self.target = target
+        self.workers = workers
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.poll_interval = poll_interval
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = {}  # Maps worker name -> running process
+        self.started_at = {}  # Maps worker name -> monotonic time its process was started
+        self.crashes = {}  # Maps worker name -> consecutive crashes
+        self.restart_at = {}  # Maps worker name -> monotonic time a crashed worker is restarted
+        self.stopping = False
+
+    def start(self, name):
+        """ Start a worker's process. """
+        args, kwargs = self.workers[name]
+        process = self.context.Process(target=self.target, args=args, kwargs=kwargs, name=name)
+        process.start()
+        self.processes[name] = process
+        self.started_at[name] = time.monotonic()
+        log.info('Started %s (pid %d)', name, process.pid)
+
+    def check(self, name, process):
+        """ Handle a worker whose process has exited. """
+        del self.processes[name]
+
+        if process.exitcode == 0 or self.stopping:
+            log.info('%s exited', name)
+            return
+
+        now = time.monotonic()
+        crashes = 1 if now - self.started_at[name] >= self.stable_after else self.crashes.get(name, 0) + 1
+        self.crashes[name] = crashes
+        delay = min(self.max_backoff, 2 ** (crashes - 1))
+        self.restart_at[name] = now + delay
+        log.warning('%s crashed with exit code %s, restarting in %d s', name, process.exitcode, delay)
+
+    def stop(self, *_):
+        """ Terminate all workers without restarting them. """
+        self.stopping = True
+        self.restart_at.clear()
+
+        for process in self.processes.values():
+            process.terminate()
+
+    def run(self):
+        """ Start all workers and supervise them until they have all exited or the supervisor is stopped. """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for name in self.workers:
+            self.start(name)
+
+        while self.processes or self.restart_at:
+            for name, process in list(self.processes.items()):
+                if not process.is_alive():
+                    process.join()
+                    self.check(name, process)
+
+            now = time.monotonic()
+
+            for name, restart_at in list(self.restart_at.items()):
+                if restart_at <= now:
+                    del self.restart_at[name]
+                    self.start(name)
+
+            time.sleep(self.poll_interval)